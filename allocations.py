@@ -0,0 +1,69 @@
+import heapq
+import tracemalloc
+
+
+ALLOCATION_TOP = 20
+ALLOCATION_FRAMES = 1 # NOTE only the allocating line is needed for grouping, more frames cost memory per trace
+
+Growth = tuple[str, int, int, int, int] # filename, lineno, size grown, blocks grown, size now
+
+
+class AllocationTracker:
+    """Allocation sites by file:line which grew while the program ran between two stops, with tracemalloc.
+    Only grouped statistics are kept, not snapshots. Each stop takes one snapshot, which is the baseline of the next
+    stop, so allocations of the debugger while paused are left out by ignoring its files."""
+    def __init__(self, ignored: tuple[str, ...] = ()):
+        # NOTE files of the debugger itself, its allocations for replies would hide the ones of the program
+        self.ignored = (tracemalloc.__file__, *ignored)
+        self.ignored_files: dict[str, bool] = {}
+        self.previous: dict[tuple[str, int], tuple[int, int]] = {}
+        self.started = False
+        self.owned = False # NOTE tracing was started here, not by the program
+
+    @property
+    def tracing(self) -> bool:
+        return self.started and tracemalloc.is_tracing()
+
+    def start(self, frames: int = ALLOCATION_FRAMES):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            self.owned = True
+        self.started = True
+        self.mark()
+
+    def stop(self):
+        if self.started and self.owned: tracemalloc.stop()
+        self.started = False
+        self.owned = False
+        self.previous = {}
+
+    def is_ignored(self, filename: str) -> bool:
+        ignored = self.ignored_files.get(filename)
+        if ignored == None:
+            ignored = self.ignored_files[filename] = filename.startswith(self.ignored) or filename.startswith("<frozen importlib") or filename == "<unknown>"
+        return ignored
+
+    def statistics(self) -> dict[tuple[str, int], tuple[int, int]]:
+        # NOTE filtering the grouped lines instead of the traces, there are far fewer lines than allocated blocks
+        statistics: dict[tuple[str, int], tuple[int, int]] = {}
+        for statistic in tracemalloc.take_snapshot().statistics("lineno"):
+            frame = statistic.traceback[0]
+            if not self.is_ignored(frame.filename):
+                statistics[(frame.filename, frame.lineno)] = (statistic.size, statistic.count)
+        return statistics
+
+    def mark(self):
+        """Baseline for the next growth."""
+        if not self.tracing: return
+        self.previous = self.statistics()
+
+    def growth(self, top: int = ALLOCATION_TOP) -> list[Growth]:
+        """The top sites which grew since the last call, largest growth first."""
+        current = self.statistics()
+        previous = self.previous
+        self.previous = current
+        grown = []
+        for site, (size, count) in current.items():
+            last_size, last_count = previous.get(site, (0, 0))
+            if size > last_size: grown.append((*site, size - last_size, count - last_count, size))
+        return heapq.nlargest(top, grown, key=lambda growth: growth[2])
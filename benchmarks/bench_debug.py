@@ -0,0 +1,237 @@
+import argparse
+import json
+import platform
+import shlex
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).parent.parent.absolute()))
+from latency import LatencyStats # noqa: E402
+from protocol import KIND_FAILURE, Reader # noqa: E402
+
+
+# NOTE Sizes are fixed so that results of two commits can be compared. Each workload runs in its own target process,
+#      started with this file and --target, and is driven through the same pipe protocol as the visualizer.
+RECURSION_DEPTH = 800
+LOCALS = 10000
+LIST_ITEMS = 1000000
+DICT_ITEMS = 200000
+BUFFER_BYTES = 16 << 20 # NOTE stats goes through memoryview.tolist() without numpy
+ATTRIBUTES = 5000
+LOOP_STEPS = 200
+STEPS = 50
+REPEAT = 5
+PAGE = 200
+
+
+####################################################################################################
+# NOTE target side, the workload stops in the debugger where the driver takes over
+
+def stop():
+    import visualpy
+    visualpy.debugger.set_trace(sys._getframe().f_back)
+
+def workload_recursion():
+    def recurse(depth: int, payload: list[int]) -> int:
+        if depth == 0:
+            stop()
+            return len(payload)
+        local = payload + [depth]
+        return recurse(depth - 1, local[-8:]) + 1
+    recurse(RECURSION_DEPTH, [])
+
+def workload_locals():
+    # NOTE a function with that many locals can only be generated
+    names = [f"v{i}" for i in range(LOCALS)]
+    source = "def many(stop):\n" + "".join(f"    {name} = {i}\n" for i, name in enumerate(names)) + "    stop()\n" + f"    for i in range({STEPS * 4}):\n        v0 += i\n        v{LOCALS-1} = str(i)\n"
+    namespace: dict[str, Any] = {}
+    exec(compile(source, "<bench locals>", "exec"), namespace)
+    namespace["many"](stop)
+
+def workload_containers():
+    numbers = list(range(LIST_ITEMS))
+    table = {i: str(i) for i in range(DICT_ITEMS)}
+    members = set(range(DICT_ITEMS))
+    buffer = bytearray(BUFFER_BYTES)
+    stop()
+    for i in range(STEPS * 4):
+        numbers[i] = -i
+        table[i] = ""
+    return numbers, table, members, buffer
+
+class Wide:
+    def __init__(self, count: int):
+        for i in range(count): setattr(self, f"attribute_{i}", i)
+
+def workload_wide():
+    wide = Wide(ATTRIBUTES)
+    stop()
+    for i in range(STEPS * 4):
+        wide.attribute_0 = i
+    return wide
+
+def workload_loop():
+    total = 0
+    values: list[int] = []
+    stop()
+    for i in range(LOOP_STEPS * 4):
+        total += i
+        values.append(total)
+    return total
+
+WORKLOADS = {
+    "recursion": workload_recursion,
+    "locals": workload_locals,
+    "containers": workload_containers,
+    "wide": workload_wide,
+    "loop": workload_loop,
+}
+
+
+####################################################################################################
+# NOTE driver side
+
+class Target:
+    def __init__(self, workload: str):
+        self.proc = subprocess.Popen([sys.executable, __file__, "--target", workload], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        assert self.proc.stdout != None
+        self.reader = Reader(self.proc.stdout) # type: ignore
+        self.ids = iter(range(1, 1 << 30))
+        self.stats = LatencyStats()
+        self.variables: dict[str, int] = {} # NOTE name -> innermost depth, from the last frames or snap
+        self.send("", "where", record=False) # NOTE waits until the workload is built and stopped
+
+    def send(self, label: str, command: str, record: bool = True) -> Any:
+        request_id = next(self.ids)
+        assert self.proc.stdin != None
+        sent = time.perf_counter()
+        self.proc.stdin.write(f"@{request_id} {command}\n".encode())
+        self.proc.stdin.flush()
+        while True:
+            message = self.reader.read()
+            if message == None: raise RuntimeError(f"The target exited during {command!r}.")
+            if message.request_id == request_id: break
+        if message.kind == KIND_FAILURE: raise RuntimeError(f"{command!r} failed: {message.payload}")
+        if not record: return message.payload
+        roundtrip = message.received - sent
+        self.stats.record(label, {
+            "target": message.target, "serialize": message.serialize, "parse": message.parse, "bytes": message.size,
+            "transfer": max(roundtrip - message.target - message.serialize, 0.0), "total": roundtrip + message.parse,
+        })
+        return message.payload
+
+    def frames(self, label: str = "frames"):
+        self.remember(self.send(label, "frames"))
+
+    def step(self):
+        self.remember(self.send("snap", "snap")["variables"])
+
+    def remember(self, variables: list[tuple]):
+        for depth, _, _, _, mode, name, _, _ in variables:
+            if mode != "-" and depth >= self.variables.get(name, -1): self.variables[name] = depth
+
+    def path(self, path: str) -> str:
+        name = path.split(".")[0].split("[")[0]
+        return f"{self.variables[name]} {shlex.quote(path)}"
+
+    def repeat(self, label: str, command: str):
+        for _ in range(REPEAT): self.send(label, command)
+
+    def close(self):
+        self.proc.kill()
+        self.proc.wait()
+
+def drive_recursion(target: Target):
+    target.frames("frames(cold)")
+    target.repeat("frames", "frames")
+    target.repeat("where", "where")
+    target.repeat("values", f"values {target.path('payload')} {target.path('depth')}")
+    for _ in range(STEPS): target.step()
+
+def drive_locals(target: Target):
+    target.frames("frames(cold)")
+    target.repeat("frames", "frames")
+    names = " ".join(target.path(f"v{i}") for i in range(0, LOCALS, LOCALS // PAGE))
+    target.repeat("values", f"values {names}")
+    target.repeat("complete", "complete")
+    for _ in range(STEPS): target.step()
+
+def drive_containers(target: Target):
+    target.frames("frames(cold)")
+    for path in ("numbers", "table", "members"):
+        target.repeat("children", f"children {target.path(path)} 0 {PAGE}")
+    target.repeat("children(deep)", f"children {target.path('numbers')} {LIST_ITEMS // 2} {PAGE}")
+    target.repeat("detail", f"detail {target.path('table[12345]')}")
+    target.repeat("stats", f"stats {target.path('buffer')}")
+    calls = 0
+    while True: # NOTE memory is sized over several calls within the budget of each
+        calls += 1
+        if not target.send("mem", "mem")["pending"]: break
+    target.stats.record("mem(calls)", {"total": float(calls)})
+    for _ in range(STEPS): target.step()
+
+def drive_wide(target: Target):
+    target.frames("frames(cold)")
+    target.repeat("detailall", f"detailall {target.path('wide')}")
+    target.repeat("children", f"children {target.path('wide')} 0 {PAGE}")
+    target.repeat("detail", f"detail {target.path('wide.attribute_4999')}")
+    for _ in range(STEPS): target.step()
+
+def drive_loop(target: Target):
+    target.frames("frames(cold)")
+    for _ in range(LOOP_STEPS): target.step()
+    target.repeat("history", "history")
+
+DRIVERS = {
+    "recursion": drive_recursion,
+    "locals": drive_locals,
+    "containers": drive_containers,
+    "wide": drive_wide,
+    "loop": drive_loop,
+}
+
+
+def run(workload: str) -> dict[str, dict[str, dict[str, float]]]:
+    target = Target(workload)
+    try: DRIVERS[workload](target)
+    finally: target.close()
+    return target.stats.summary()
+
+def print_summary(workload: str, summary: dict[str, dict[str, dict[str, float]]]):
+    print(f"{workload}")
+    print(f"  {'command':16}{'count':>7}{'p50':>10}{'p90':>10}{'target p50':>12}{'bytes p50':>12}")
+    for label, metrics in summary.items():
+        total, target, size = metrics.get("total"), metrics.get("target"), metrics.get("bytes")
+        if label.endswith("(calls)"):
+            print(f"  {label:16}{int(total['max']) if total else 0:>7}")
+            continue
+        assert total != None
+        print(f"  {label:16}{total['count']:>7}{total['p50']*1000:>8.2f}ms{total['p90']*1000:>8.2f}ms"
+              f"{(target['p50']*1000 if target else 0):>10.2f}ms{int(size['p50']) if size else 0:>12}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and bytes per command of the Debug backend, without the visualizer.")
+    parser.add_argument("workloads", nargs="*", help=f"workloads to run, all by default: {', '.join(WORKLOADS)}")
+    parser.add_argument("--json", help="also write the summaries to this file")
+    parser.add_argument("--target", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.target:
+        WORKLOADS[args.target]()
+        return
+    for workload in args.workloads:
+        if workload not in WORKLOADS: parser.error(f"unknown workload {workload!r}")
+
+    print(f"Python {platform.python_version()} on {platform.system()}, round trip p50/p90 of {REPEAT} repeats or every step")
+    results = {}
+    for workload in args.workloads or WORKLOADS:
+        results[workload] = run(workload)
+        print_summary(workload, results[workload])
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({"python": platform.python_version(), "platform": platform.system(), "results": results}, file, indent=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import inspect
+import sys
+import time
+from pathlib import Path
+from types import FrameType
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).parent.parent.absolute()))
+from locations import frame_location, frame_positions # noqa: E402
+
+
+DEPTH = 500
+REPEAT = 20
+
+def make_stack(depth: int) -> list[FrameType]:
+    if depth:
+        return make_stack(depth - 1)
+    frames: list[FrameType] = []
+    frame = sys._getframe()
+    while frame != None:
+        frames.append(frame)
+        frame = frame.f_back # type: ignore
+    return frames
+
+# NOTE former do_seek / do_where: getframeinfo reads source context and resolves positions per frame
+def seek_getframeinfo(frames: list[FrameType]):
+    result = []
+    for frame in frames:
+        info = inspect.getframeinfo(frame)
+        positions = info.positions
+        result.append((info.filename, info.lineno, info.function, (positions.lineno, positions.col_offset, positions.end_lineno, positions.end_col_offset))) # type: ignore
+    return result
+
+def where_getframeinfo(frames: list[FrameType]):
+    return [(info.filename, info.lineno, info.function) for info in map(inspect.getframeinfo, frames)]
+
+def seek_locations(frames: list[FrameType]):
+    return [frame_positions(frame) for frame in frames]
+
+def where_locations(frames: list[FrameType]):
+    return [frame_location(frame) for frame in frames]
+
+
+def best_of(function: Callable[[], object]) -> float:
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), DEPTH + 100))
+    frames = make_stack(DEPTH)
+    # NOTE only the suspended frames of make_stack, the frame of main moves between the calls.
+    assert seek_getframeinfo(frames[:DEPTH]) == seek_locations(frames[:DEPTH])
+    assert where_getframeinfo(frames[:DEPTH]) == where_locations(frames[:DEPTH])
+
+    results = [
+        ("where", best_of(lambda: where_getframeinfo(frames)), best_of(lambda: where_locations(frames))),
+        ("seek", best_of(lambda: seek_getframeinfo(frames)), best_of(lambda: seek_locations(frames))),
+    ]
+
+    print(f"Stack of {len(frames)} frames, best of {REPEAT}")
+    print(f"{'':16}{'getframeinfo':>14}{'locations':>12}{'speedup':>10}")
+    for name, old_time, new_time in results:
+        print(f"{name:16}{old_time*1000:>12.2f}ms{new_time*1000:>10.3f}ms{old_time/new_time:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import io
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).parent.parent.absolute()))
+from protocol import Reader, encode # noqa: E402
+
+
+VARIABLES = 10000
+REPEAT = 5
+
+def make_snapshot(count: int) -> list[tuple[int, str, int, str, str, str, str, str]]:
+    return [
+        (i % 20, "/home/user/project/main.py", 10 + i % 20, f"function_{i % 20}", "+*-"[i % 3], f"variable_{i}", "list", repr(list(range(i % 30))))
+        for i in range(count)
+    ]
+
+# NOTE text format of the former protocol ("lines: N" header, two lines per variable)
+def encode_text(snapshot: list[tuple[int, str, int, str, str, str, str, str]]) -> bytes:
+    text = ""
+    for depth, filename, lineno, function, mode, name, type_, value in snapshot:
+        text += f'[{depth}] File "{filename}", line {lineno}, in {function}\n'
+        text += mode + " " + name + " " + type_ + " " + value + "\n"
+    return ("[visualpy] lines: " + str(text.count("\n")) + "\n" + text.strip() + "\n").encode()
+
+def decode_text(stream: io.TextIOWrapper) -> list[tuple[int, str, str, str, str]]:
+    while not (lineinfo := stream.readline().replace("[visualpy] ", "").strip()).startswith("lines: "): ...
+    lines = int(lineinfo.replace("lines: ", ""))
+    info = [stream.readline().rstrip("\n") for _ in range(lines)]
+    variables: list[tuple[int, str, str, str, str]] = []
+    for line_index in range(0, len(info), 2):
+        frame_index = int(info[line_index].split(" ")[0][1:-1])
+        sub_mode = info[line_index+1].index(" ")
+        mode = info[line_index+1][:sub_mode]
+        sub_name = info[line_index+1].index(" ", sub_mode+1)
+        name = info[line_index+1][sub_mode+1:sub_name]
+        sub_type = info[line_index+1].index(" ", sub_name+1)
+        type_ = info[line_index+1][sub_name+1:sub_type]
+        value = info[line_index+1][sub_type+1:]
+        variables.append((frame_index, mode, name, type_, value))
+    return variables
+
+def encode_binary(snapshot: list[tuple[int, str, int, str, str, str, str, str]]) -> bytes:
+    return b"[visualpy] " + encode(snapshot)
+
+def decode_binary(stream: io.BufferedReader) -> list[tuple[int, str, str, str, str]]:
+    message = Reader(stream).read()
+    assert message != None
+    return [(depth, mode, name, type_, value) for depth, _, _, _, mode, name, type_, value in message.payload]
+
+
+def best_of(function: Callable[[], object]) -> float:
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def through_pipe(data: bytes, decode: Callable[[int], object]) -> float:
+    def run():
+        read_fd, write_fd = os.pipe()
+        def writer():
+            with os.fdopen(write_fd, "wb") as f: f.write(data)
+        thread = threading.Thread(target=writer)
+        thread.start()
+        decode(read_fd)
+        thread.join()
+    return best_of(run)
+
+def main():
+    snapshot = make_snapshot(VARIABLES)
+    text_data = encode_text(snapshot)
+    binary_data = encode_binary(snapshot)
+    assert decode_text(io.TextIOWrapper(io.BytesIO(text_data))) == decode_binary(io.BufferedReader(io.BytesIO(binary_data))) # type: ignore
+
+    def decode_text_fd(fd: int):
+        with os.fdopen(fd, "r") as f: decode_text(f) # type: ignore
+    def decode_binary_fd(fd: int):
+        with os.fdopen(fd, "rb") as f: decode_binary(f) # type: ignore
+
+    results = [
+        ("encode", best_of(lambda: encode_text(snapshot)), best_of(lambda: encode_binary(snapshot))),
+        ("decode", best_of(lambda: decode_text(io.TextIOWrapper(io.BytesIO(text_data)))), best_of(lambda: decode_binary(io.BufferedReader(io.BytesIO(binary_data))))), # type: ignore
+        ("pipe + decode", through_pipe(text_data, decode_text_fd), through_pipe(binary_data, decode_binary_fd)),
+    ]
+
+    print(f"Snapshot of {VARIABLES} variables, best of {REPEAT}")
+    print(f"{'':16}{'text':>12}{'binary':>12}{'speedup':>10}")
+    print(f"{'bytes':16}{len(text_data):>12}{len(binary_data):>12}{len(text_data)/len(binary_data):>9.2f}x")
+    for name, text_time, binary_time in results:
+        print(f"{name:16}{text_time*1000:>10.2f}ms{binary_time*1000:>10.2f}ms{text_time/binary_time:>9.2f}x")
+
+if __name__ == "__main__":
+    main()
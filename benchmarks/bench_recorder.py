@@ -0,0 +1,79 @@
+import bdb
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.absolute()))
+from recorder import Recorder, TraceReader # noqa: E402
+import reprlib # noqa: E402
+
+
+ITERATIONS = 200000
+
+def workload():
+    total = 0
+    values = []
+    for i in range(ITERATIONS):
+        total += i * i
+        if i % 100 == 0:
+            values.append(total)
+    return total, len(values)
+
+def render(value: object) -> tuple[str, bool]:
+    return reprlib.repr(value), False
+
+class Stepper(bdb.Bdb):
+    # NOTE the trace function pdb runs on, stopping nowhere
+    def user_line(self, frame): ...
+
+def run_plain() -> float:
+    start = time.perf_counter()
+    workload()
+    return time.perf_counter() - start
+
+def run_bdb() -> float:
+    stepper = Stepper()
+    start = time.perf_counter()
+    stepper.runcall(workload)
+    return time.perf_counter() - start
+
+def run_recorded(path: Path) -> float:
+    recorder = Recorder(path, render)
+    start = time.perf_counter()
+    recorder.start(sys._getframe())
+    workload()
+    recorder.stop()
+    return time.perf_counter() - start
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "workload.vpt"
+        plain = min(run_plain() for _ in range(3))
+        stepped = min(run_bdb() for _ in range(3))
+        recorded = min(run_recorded(path) for _ in range(3))
+
+        start = time.perf_counter()
+        reader = TraceReader(path)
+        opened = time.perf_counter() - start
+        steps = random.Random(0).sample(range(len(reader)), 200)
+        start = time.perf_counter()
+        for step in steps: reader.step(step)
+        seek = (time.perf_counter() - start) / len(steps)
+        start = time.perf_counter()
+        for step in range(10000): reader.step(step)
+        scrub = (time.perf_counter() - start) / 10000
+        reader.close()
+
+        print(f"Loop of {ITERATIONS} iterations, {'sys.monitoring' if hasattr(sys, 'monitoring') else 'sys.settrace'} recorder")
+        print(f"{'plain':24}{plain*1000:>10.1f}ms")
+        print(f"{'bdb trace (no stops)':24}{stepped*1000:>10.1f}ms{stepped/plain:>8.1f}x")
+        print(f"{'recorded':24}{recorded*1000:>10.1f}ms{recorded/plain:>8.1f}x")
+        print(f"{'trace':24}{path.stat().st_size/1e6:>10.1f}MB{len(reader):>10} steps")
+        print(f"{'open':24}{opened*1000:>10.3f}ms")
+        print(f"{'random step':24}{seek*1000:>10.3f}ms")
+        print(f"{'next step':24}{scrub*1000:>10.3f}ms")
+
+if __name__ == "__main__":
+    main()
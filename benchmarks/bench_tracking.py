@@ -0,0 +1,75 @@
+import reprlib
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.absolute()))
+from tracking import fingerprint # noqa: E402
+
+
+STEPS = 20
+
+class Point:
+    def __init__(self, x: int, y: int):
+        self.x = x
+        self.y = y
+
+def make_locals() -> dict[str, object]:
+    return {
+        "numbers": list(range(1000000)),
+        "table": {i: str(i) for i in range(100000)},
+        "seen": set(range(100000)),
+        "point": Point(1, 2),
+        "text": "x" * 10000,
+        **{f"counter_{i}": i for i in range(1000)}
+    }
+
+def mutate(local: dict[str, object], step: int):
+    local["numbers"].append(step) # type: ignore
+    local["table"][-step] = str(step) # type: ignore
+    if step % 2: local["seen"].add(-step) # type: ignore
+    local["point"].x = step # type: ignore
+
+# NOTE Without fingerprints, an in-place mutation is visible only by rendering every value again.
+def step_repr_all(local: dict[str, object], last: dict[str, str]) -> int:
+    changed = 0
+    for name, value in local.items():
+        text = repr(value)
+        if last.get(name) != text: changed += 1
+        last[name] = text
+    return changed
+
+def step_fingerprint(local: dict[str, object], last: dict[str, int | None]) -> int:
+    changed = 0
+    for name, value in local.items():
+        value_fingerprint = fingerprint(value)
+        if value_fingerprint == None or last.get(name) != value_fingerprint:
+            changed += 1
+            reprlib.repr(value) # NOTE only changed values are rendered again, bounded like the debugger does
+        last[name] = value_fingerprint
+    return changed
+
+def run(step_function) -> tuple[float, int]:
+    local = make_locals()
+    last: dict = {}
+    step_function(local, last)
+    elapsed = 0.0
+    changed = 0
+    for step in range(1, STEPS+1):
+        mutate(local, step)
+        start = time.perf_counter()
+        changed += step_function(local, last)
+        elapsed += time.perf_counter() - start
+    return elapsed / STEPS, changed
+
+def main():
+    repr_time, repr_changed = run(step_repr_all)
+    fingerprint_time, fingerprint_changed = run(step_fingerprint)
+    print(f"Loop of {STEPS} steps mutating large containers in place")
+    print(f"{'':14}{'per step':>12}{'changed':>10}")
+    print(f"{'repr all':14}{repr_time*1000:>10.2f}ms{repr_changed:>10}")
+    print(f"{'fingerprint':14}{fingerprint_time*1000:>10.2f}ms{fingerprint_changed:>10}")
+    print(f"speedup {repr_time/fingerprint_time:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+from dataclasses import dataclass
+import sys
+from typing import Any
+
+from locations import Positions
+
+
+HISTORY_BYTES = 64 << 20
+KEYFRAME_INTERVAL = 256
+ENTRY_BYTES = 120 # NOTE rough cost of a change tuple and its dict slot besides the strings
+
+Change = tuple[int, str, str, str, str, bool] # depth, mode ("+*-"), name, typename, value, truncated
+Values = dict[str, tuple[str, str, bool]] # name -> typename, value, truncated
+
+
+@dataclass(slots=True)
+class HistoryStep:
+    stack: list[tuple[str, int, str, Positions]]
+    changes: list[Change]
+    keyframe: tuple[Values, ...] | None
+    size: int
+
+
+class History:
+    """Rendered locals of past steps, kept as per-step changes with a keyframe every keyframe_interval steps.
+    Keyframes share the dicts of depths which did not change in between, and whole blocks of the oldest steps are
+    evicted once the history grows over limit bytes."""
+    def __init__(self, limit: int = HISTORY_BYTES, keyframe_interval: int = KEYFRAME_INTERVAL):
+        self.limit = limit
+        self.keyframe_interval = keyframe_interval
+        self.steps: list[HistoryStep] = []
+        self.first = 0 # NOTE step number of steps[0], always a keyframe
+        self.current: list[Values] = []
+        self.shared: set[int] = set() # NOTE depths of current whose dict belongs to the last keyframe
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.first + len(self.steps)
+
+    def clear(self):
+        self.first += len(self.steps)
+        self.steps.clear()
+        self.current.clear()
+        self.shared.clear()
+        self.size = 0
+
+    def writable(self, depth: int) -> Values:
+        while depth >= len(self.current):
+            self.current.append({})
+        if depth in self.shared:
+            self.current[depth] = dict(self.current[depth])
+            self.shared.discard(depth)
+        return self.current[depth]
+
+    def record(self, stack: list[tuple[str, int, str, Positions]], changes: list[Change]) -> int:
+        """Store one step. Changes of mode "?" are kept only if the rendered value differs. Returns the step number."""
+        applied: list[Change] = []
+        size = 0
+        for depth, mode, name, typename, text, truncated in changes:
+            values = self.writable(depth)
+            if mode == "-":
+                values.pop(name, None)
+            else:
+                if mode == "?":
+                    if values.get(name) == (typename, text, truncated): continue
+                    mode = "*"
+                values[name] = (typename, text, truncated)
+            applied.append((depth, mode, name, typename, text, truncated))
+            size += len(name) + len(text) + ENTRY_BYTES
+        del self.current[len(stack):]
+        self.shared = {depth for depth in self.shared if depth < len(stack)}
+
+        keyframe = None
+        if len(self.steps) % self.keyframe_interval == 0:
+            for depth, values in enumerate(self.current):
+                if depth not in self.shared: size += sys.getsizeof(values)
+            keyframe = tuple(self.current)
+            self.shared = set(range(len(self.current)))
+        self.steps.append(HistoryStep(stack, applied, keyframe, size))
+        self.size += size
+        self.evict()
+        return len(self) - 1
+
+    def evict(self):
+        # NOTE the newest block stays, otherwise the latest steps could not be rebuilt
+        while self.size > self.limit and len(self.steps) > self.keyframe_interval:
+            block = self.steps[:self.keyframe_interval]
+            del self.steps[:self.keyframe_interval]
+            self.first += len(block)
+            self.size -= sum(step.size for step in block)
+
+    def state(self, step: int) -> tuple[list[tuple[str, int, str, Positions]], list[Values], list[Change]]:
+        """Stack, values per depth (outermost first) and changes of the given step."""
+        index = step - self.first
+        if not 0 <= index < len(self.steps):
+            raise IndexError(f"Step {step} is not in the history (steps {self.first} to {len(self)-1}).")
+        base = index - index % self.keyframe_interval
+        frames = list(self.steps[base].keyframe) # type: ignore
+        copied: set[int] = set()
+        for entry in self.steps[base+1:index+1]:
+            for depth, mode, name, typename, text, truncated in entry.changes:
+                while depth >= len(frames): frames.append({})
+                if depth not in copied:
+                    frames[depth] = dict(frames[depth])
+                    copied.add(depth)
+                if mode == "-": frames[depth].pop(name, None)
+                else: frames[depth][name] = (typename, text, truncated)
+            del frames[len(entry.stack):]
+        entry = self.steps[index]
+        return entry.stack, frames, entry.changes
+
+    def describe(self) -> dict[str, Any]:
+        return {"first": self.first, "end": len(self), "bytes": self.size, "limit": self.limit}
@@ -0,0 +1,52 @@
+from collections import deque
+import json
+import math
+from typing import Any
+
+
+LATENCY_SAMPLES = 1000 # NOTE newest samples kept per command
+PERCENTILES = (50, 90, 99)
+# NOTE seconds unless noted. transfer is the round trip without the target work, or run for commands which resume
+#      the program, as it includes the time the program ran.
+METRICS = ("target", "serialize", "transfer", "run", "parse", "queue", "apply", "render", "total", "bytes")
+
+Sample = dict[str, float]
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+class LatencyStats:
+    """Timings of every reply by command name, the first word of the command."""
+    def __init__(self, limit: int = LATENCY_SAMPLES):
+        self.limit = limit
+        self.samples: dict[str, deque[Sample]] = {}
+
+    def record(self, command: str, sample: Sample) -> Sample:
+        """Keep sample, returned to add timings known only later such as render."""
+        name = command.split(" ", 1)[0] or "(empty)"
+        samples = self.samples.get(name)
+        if samples == None: samples = self.samples[name] = deque(maxlen=self.limit)
+        samples.append(sample)
+        return sample
+
+    def clear(self):
+        self.samples.clear()
+
+    def summary(self) -> dict[str, dict[str, dict[str, float]]]:
+        """count, percentiles and max of each metric by command."""
+        summary: dict[str, dict[str, dict[str, float]]] = {}
+        for name, samples in sorted(self.samples.items()):
+            metrics = summary[name] = {}
+            for metric in METRICS:
+                values = sorted(sample[metric] for sample in samples if metric in sample)
+                if not values: continue
+                metrics[metric] = {"count": len(values), **{f"p{percent}": percentile(values, percent) for percent in PERCENTILES}, "max": values[-1]}
+        return summary
+
+    def export(self, path: str):
+        data: dict[str, Any] = {"summary": self.summary(), "samples": {name: list(samples) for name, samples in self.samples.items()}}
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(data, file, indent=1)
@@ -0,0 +1,26 @@
+from types import CodeType, FrameType
+import weakref
+
+
+Positions = tuple[int | None, int | None, int | None, int | None] # lineno, col_offset, end_lineno, end_col_offset
+
+# NOTE co_positions() yields one entry per code unit (2 bytes), so f_lasti // 2 indexes the table.
+_position_tables: "weakref.WeakKeyDictionary[CodeType, list[Positions]]" = weakref.WeakKeyDictionary()
+
+def position_table(code: CodeType) -> list[Positions]:
+    table = _position_tables.get(code)
+    if table == None:
+        table = _position_tables[code] = [(lineno, col, end_lineno, end_col) for lineno, end_lineno, col, end_col in code.co_positions()]
+    return table
+
+def frame_location(frame: FrameType) -> tuple[str, int, str]:
+    code = frame.f_code
+    return (code.co_filename, frame.f_lineno, code.co_name)
+
+def frame_positions(frame: FrameType) -> tuple[str, int, str, Positions]:
+    code = frame.f_code
+    lineno = frame.f_lineno
+    index = frame.f_lasti // 2
+    table = position_table(code)
+    positions = table[index] if 0 <= index < len(table) else (lineno, None, lineno, None)
+    return (code.co_filename, lineno, code.co_name, positions)
@@ -0,0 +1,107 @@
+from itertools import islice
+import sys
+import time
+from typing import Any, Hashable, Iterator
+
+from pympler import asizeof
+
+
+MEMORY_BUDGET = 0.05 # NOTE seconds of sizing per mem command, the rest is left for the next ones
+SPLIT_ITEMS = 1024 # NOTE containers longer than this are sized this many items at a time
+SPLIT_TYPES = {list, tuple, set, frozenset, dict}
+SIZER_LIMIT = 100 # NOTE default recursion limit of asizeof.Asizer
+
+MemoryRow = tuple[int, bool] # size in bytes, exact (False while the value waits for its turn)
+
+
+class MemoryMeter:
+    """Deep sizes of many values, each object counted once for the first value which reaches it.
+    Values are given with a key which changes whenever the value may have changed. A pass over the same keys goes on
+    from call to call within the time budget. When some keys change, the sizes of the others are kept and only the
+    changed values are sized again, each on its own, so objects they share with other values are counted again.
+    When no key is left, a new pass starts, showing sizes of the previous pass as estimates."""
+    def __init__(self):
+        self.keys: list[Hashable] = []
+        self.sizes: list[int | None] = []
+        self.sizer = asizeof.Asizer()
+        self.shared = True # NOTE every value is sized with one sizer, until keys change
+        self.done = 0 # NOTE values before this index are sized
+        # NOTE items left of a long container at index done, and the size counted so far
+        self.items: Iterator[Any] | None = None
+        self.partial = 0
+        self.estimates: dict[Hashable, int] = {}
+        self.elapsed = 0.0
+
+    def pending(self) -> int:
+        return self.sizes.count(None)
+
+    def restart(self, keys: list[Hashable]):
+        self.estimates = {key: size for key, size in zip(self.keys, self.sizes) if size != None}
+        self.keys = keys
+        self.sizes = [None] * len(keys)
+        self.sizer = asizeof.Asizer()
+        self.shared = True
+        self.done = 0
+        self.items = None
+        self.elapsed = 0.0
+
+    def update(self, keys: list[Hashable]):
+        sizes = dict(zip(self.keys, self.sizes))
+        if not any(key in sizes for key in keys):
+            self.restart(keys)
+            return
+        current = self.keys[self.done] if self.items != None else None
+        self.keys = keys
+        self.sizes = [sizes.get(key) for key in keys]
+        self.shared = False
+        self.done = 0
+        # NOTE a long container which is partly sized goes on if its key is still there
+        if self.items != None and current in keys: self.done = keys.index(current)
+        else: self.items = None
+
+    def measure(self, values: list[tuple[Hashable, Any]], budget: float = MEMORY_BUDGET) -> list[MemoryRow]:
+        keys = [key for key, _ in values]
+        if keys != self.keys: self.update(keys)
+        start = time.perf_counter()
+        deadline = start + budget
+        # NOTE at least one item is sized per call, otherwise a single slow object would never finish
+        while True:
+            while self.done < len(values) and self.sizes[self.done] != None: self.done += 1
+            if self.done == len(values): break
+            if self.step(values[self.done][1]):
+                self.sizes[self.done] = self.partial
+                self.done += 1
+                self.items = None
+            if time.perf_counter() >= deadline: break
+        self.elapsed += time.perf_counter() - start
+        rows: list[MemoryRow] = []
+        for index, ((key, value), size) in enumerate(zip(values, self.sizes)):
+            if size != None: rows.append((size, True))
+            elif index == self.done and self.items != None: rows.append((max(self.estimates.get(key, 0), self.partial), False))
+            else: rows.append((self.estimates.get(key, sys.getsizeof(value, 0)), False))
+        return rows
+
+    def step(self, value: Any) -> bool:
+        """Size value or the next items of it. Returns True when the size of value is complete in partial."""
+        if self.items == None:
+            if not self.shared: self.sizer = asizeof.Asizer()
+            if type(value) not in SPLIT_TYPES or len(value) <= SPLIT_ITEMS:
+                self.partial = self.sizer.asizeof(value)
+                return True
+            # NOTE the container alone first, then its items in chunks sharing the seen objects of the sizer
+            # NOTE options given to asizeof stay set on the sizer, the limit is put back for the values after this one
+            self.partial = self.sizer.asizeof(value, limit=0)
+            self.sizer.set(limit=SIZER_LIMIT)
+            self.items = iter(value.items() if type(value) is dict else value)
+        chunk = 0
+        try:
+            for item in islice(self.items, SPLIT_ITEMS):
+                self.partial += self.sizer.asizeof(*item) if type(value) is dict else self.sizer.asizeof(item)
+                chunk += 1
+        except RuntimeError: # NOTE changed size during iteration, counted as is
+            return True
+        return chunk < SPLIT_ITEMS
+
+    def total(self) -> int:
+        """Bytes of every value sized so far, shared objects counted once within a pass."""
+        return sum(size for size in self.sizes if size != None)
@@ -0,0 +1,89 @@
+import sys
+import threading
+import time
+from types import FrameType
+from typing import Callable
+
+
+PROFILE_INTERVAL = 0.001 # NOTE seconds between samples, in practice bounded by sys.getswitchinterval() too
+PROFILE_LINES = 2000
+
+LineTimes = tuple[str, int, int, float, float, float | None] # filename, lineno, samples, self wall, total wall, self cpu
+
+
+class LineProfiler:
+    """Samples the line the program thread is running from a second thread, only while the program runs.
+    Time since the previous sample goes to the innermost line as self time and to every line on the stack as total time.
+    Frames of files in skipped are passed over, samples taken while a frame of paused is on the stack are dropped."""
+    def __init__(self, skipped: tuple[str, ...] = (), paused: tuple[str, ...] = (), interval: float = PROFILE_INTERVAL):
+        self.skipped = skipped
+        self.paused = paused
+        self.interval = interval
+        self.lines: dict[tuple[str, int], list] = {} # NOTE [samples, self wall, total wall, self cpu]
+        self.running = threading.Event()
+        self.enabled = False
+        self.thread: threading.Thread | None = None
+        self.target = 0
+        self.cpu_clock: Callable[[], float] | None = None
+
+    def start(self):
+        """Profile the calling thread from now on, sampled only between resume and pause."""
+        self.target = threading.get_ident()
+        self.cpu_clock = None
+        if hasattr(time, "pthread_getcpuclockid"): # NOTE the CPU time of another thread is not available on Windows
+            clock = time.pthread_getcpuclockid(self.target)
+            self.cpu_clock = lambda: time.clock_gettime(clock)
+        self.enabled = True
+        if self.thread == None:
+            self.thread = threading.Thread(target=self.sample, name="visualpy-profiler", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.enabled = False
+        self.running.clear()
+
+    def clear(self):
+        self.lines.clear()
+
+    def resume(self):
+        if self.enabled: self.running.set()
+
+    def pause(self):
+        self.running.clear()
+
+    def sample(self):
+        while True:
+            self.running.wait()
+            last = time.perf_counter()
+            last_cpu = self.cpu_clock() if self.cpu_clock != None else 0.0
+            while self.running.is_set():
+                time.sleep(self.interval)
+                now = time.perf_counter()
+                cpu = self.cpu_clock() if self.cpu_clock != None else 0.0
+                frame = sys._current_frames().get(self.target)
+                if frame != None and self.running.is_set(): self.record(frame, now - last, cpu - last_cpu)
+                last, last_cpu = now, cpu
+
+    def record(self, frame: FrameType | None, wall: float, cpu: float):
+        stack: list[tuple[str, int]] = []
+        while frame != None:
+            filename = frame.f_code.co_filename
+            if filename.startswith(self.paused): return # NOTE the debugger is waiting for commands
+            if not filename.startswith(self.skipped): stack.append((filename, frame.f_lineno))
+            frame = frame.f_back
+        if not stack: return
+        lines = self.lines
+        for line in set(stack): # NOTE recursion counts a line once per sample
+            times = lines.get(line)
+            if times == None: times = lines[line] = [0, 0.0, 0.0, 0.0]
+            times[2] += wall
+        times = lines[stack[0]]
+        times[0] += 1
+        times[1] += wall
+        times[3] += cpu
+
+    def report(self, limit: int = PROFILE_LINES) -> list[LineTimes]:
+        """Lines by self wall time, largest first. Lines which only ran callees follow by total wall time."""
+        rows = [(filename, lineno, samples, wall, total, cpu if self.cpu_clock != None else None) for (filename, lineno), (samples, wall, total, cpu) in list(self.lines.items())]
+        rows.sort(key=lambda row: (row[3], row[4]), reverse=True)
+        return rows[:limit]
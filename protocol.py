@@ -0,0 +1,88 @@
+import marshal
+import struct
+import time
+from typing import IO, Any, Callable, NamedTuple
+
+
+# NOTE Every reply of Debug is framed as HEADER + marshal payload.
+#      Bytes outside of a frame (prompts, prints of the debugging program) are passed to on_output.
+VERSION = 2
+MAGIC = b"\x00VPY"
+HEADER = struct.Struct("<4sBBIIII") # magic, version, kind, request id, payload length, target work and serialize time in microseconds
+MICROSECONDS_MAX = (1 << 32) - 1
+
+KIND_REPLY = 0
+KIND_FAILURE = 1
+
+
+class ProtocolError(Exception): ...
+
+class Message(NamedTuple):
+    kind: int
+    request_id: int
+    payload: Any
+    # NOTE timings in seconds: work of the target for the command, marshal.dumps in the target, marshal.loads here
+    target: float = 0.0
+    serialize: float = 0.0
+    parse: float = 0.0
+    size: int = 0
+    received: float = 0.0 # NOTE time.perf_counter() when the whole frame was read
+
+
+def microseconds(seconds: float) -> int:
+    return min(max(int(seconds * 1e6), 0), MICROSECONDS_MAX)
+
+def encode(payload: Any, kind: int = KIND_REPLY, request_id: int = 0, target: float = 0.0) -> bytes:
+    start = time.perf_counter()
+    body = marshal.dumps(payload)
+    return HEADER.pack(MAGIC, VERSION, kind, request_id, len(body), microseconds(target), microseconds(time.perf_counter() - start)) + body
+
+def _magic_prefix_length(buffer: bytearray) -> int:
+    for size in range(min(len(MAGIC) - 1, len(buffer)), 0, -1):
+        if buffer.endswith(MAGIC[:size]):
+            return size
+    return 0
+
+
+class Reader:
+    def __init__(self, stream: IO[bytes]):
+        self.stream = stream
+        self.buffer = bytearray()
+
+    def _take(self, size: int) -> bytes | None:
+        if not self.buffer:
+            data = self.stream.read(size)
+            return data if data is not None and len(data) == size else None
+        if len(self.buffer) < size:
+            rest = self.stream.read(size - len(self.buffer))
+            if rest is None or len(rest) < size - len(self.buffer):
+                return None
+            self.buffer += rest
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def read(self, on_output: Callable[[bytes], Any] | None = None) -> Message | None:
+        """Read the next message. Returns None when the stream is closed."""
+        while (index := self.buffer.find(MAGIC)) == -1:
+            keep = _magic_prefix_length(self.buffer)
+            if len(self.buffer) > keep:
+                if on_output: on_output(bytes(self.buffer[:len(self.buffer)-keep]))
+                del self.buffer[:len(self.buffer)-keep]
+            chunk = self.stream.read1(65536) # type: ignore
+            if not chunk: return None
+            self.buffer += chunk
+        if index:
+            if on_output: on_output(bytes(self.buffer[:index]))
+            del self.buffer[:index]
+
+        header = self._take(HEADER.size)
+        if header == None: return None
+        if header[4] != VERSION: # NOTE checked before unpacking, headers of other versions have other sizes
+            raise ProtocolError(f"Unsupported protocol version {header[4]} (expected {VERSION}).")
+        _, _, kind, request_id, length, target, serialize = HEADER.unpack(header)
+        body = self._take(length)
+        if body == None: return None
+        received = time.perf_counter()
+        payload = marshal.loads(body)
+        return Message(kind, request_id, payload, target / 1e6, serialize / 1e6, time.perf_counter() - received, len(body), received)
@@ -0,0 +1,383 @@
+from dataclasses import dataclass, field
+import dis
+import inspect
+from itertools import count
+import marshal
+import mmap
+import os
+from pathlib import Path
+import struct
+import sys
+import sysconfig
+import threading
+from types import CodeType, FrameType
+from typing import Any, Callable, Iterable
+
+from tracking import IDENTITY_TYPES, fingerprint
+
+
+# NOTE A trace is TRACE_HEADER followed by chunks of CHUNK_STEPS steps, each a marshal (keyframe, records) prefixed with its length.
+#      The keyframe is the whole stack after the first record, other records only carry the changes of one frame.
+#      A record without changes in the frame of the record before it is only its line number.
+#      <trace>.idx holds the offset of every chunk as uint64, so step n is found by reading one chunk.
+TRACE_MAGIC = b"\x00VPT"
+TRACE_VERSION = 2
+TRACE_HEADER = struct.Struct("<4sBI") # magic, version, steps per chunk
+CHUNK_HEADER = struct.Struct("<I")
+INDEX_ENTRY = struct.Struct("<Q")
+CHUNK_STEPS = 1024
+
+# NOTE recorded as is and rendered when read, without the render budget.
+SCALAR_TYPES: set[type] = {int, float, bool, type(None)}
+
+Change = tuple[str, str, str, str, bool] # mode ("+*-"), name, typename, value, truncated
+# NOTE in the trace a scalar change has no typename and the value itself, see rendered
+RecordedChange = tuple[str, str, str | None, Any, bool]
+
+def rendered(typename: str | None, value: Any) -> tuple[str, str]:
+    if typename != None: return typename, value
+    try: return type(value).__name__, repr(value)
+    except ValueError: return "int", f"<int of {value.bit_length()} bits>" # NOTE exceeds the limit of int string conversion
+
+def index_path(path: str | Path) -> Path:
+    return Path(str(path) + ".idx")
+
+def line_names(code: CodeType) -> dict[int, tuple[tuple[str, ...], tuple[str, ...]]]:
+    """Local names each line of code may rebind (stores, deletes, cell and free variables on every line), and the
+    names it only loads."""
+    local_ops = {*dis.haslocal, *dis.hasfree}
+    lines: dict[int, tuple[set[str], set[str]]] = {}
+    starts = dict(dis.findlinestarts(code))
+    lineno = code.co_firstlineno
+    for instruction in dis.get_instructions(code):
+        lineno = starts.get(instruction.offset) or lineno
+        rebound, loaded = lines.setdefault(lineno, (set(), set()))
+        if instruction.opcode in local_ops:
+            names = (instruction.argval,) if isinstance(instruction.argval, str) else instruction.argval
+            opname = instruction.opname
+            (loaded if opname.startswith("LOAD_") and not opname.endswith("_CLEAR") else rebound).update(names)
+    shared = {*code.co_cellvars, *code.co_freevars}
+    return {lineno: ((*rebound.difference(shared), *shared), tuple(loaded - rebound - shared)) for lineno, (rebound, loaded) in lines.items()}
+
+def library_prefixes() -> tuple[str, ...]:
+    paths = sysconfig.get_paths()
+    prefixes: set[str] = set()
+    for key in ("stdlib", "platstdlib", "purelib", "platlib"):
+        if key not in paths: continue
+        prefixes.add(os.path.join(paths[key], ""))
+        prefixes.add(os.path.join(os.path.realpath(paths[key]), ""))
+    return tuple(prefixes)
+
+
+# NOTE compared with None on every line, eq=False keeps that from calling a generated __eq__
+@dataclass(slots=True, eq=False)
+class FrameState:
+    serial: int
+    parent: int
+    filename: str
+    function: str
+    lines: dict[int, tuple[tuple[str, ...], tuple[str, ...]]] | None # NOTE of line_names, None to check every local on every line
+    lineno: int = 0
+    values: dict[str, tuple[Any, int | bytes | None, str | None, Any, bool]] = field(default_factory=dict) # name -> value, fingerprint, typename, text, truncated as recorded
+    recorded: bool = False
+
+
+class Recorder:
+    def __init__(self, path: str | Path, render: Callable[[object], tuple[str, bool]], exclude: Iterable[str] = (), chunk_steps: int = CHUNK_STEPS):
+        self.path = Path(path)
+        self.render = render
+        self.exclude = {__file__, *exclude}
+        self.prefixes = library_prefixes()
+        self.chunk_steps = chunk_steps
+        self.file = open(self.path, "wb")
+        self.index = open(index_path(self.path), "wb")
+        self.file.write(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, chunk_steps))
+        self.offset = TRACE_HEADER.size
+        self.keyframe: list[tuple[int, int, str, str, int, list[tuple[str, str | None, Any, bool]]]] = []
+        self.records: list[tuple[int, int, list[RecordedChange], tuple | None] | int] = []
+        self.steps = 0
+        self.serial = 0 # NOTE of the last record
+        self.serials = count(1)
+        # NOTE keyed by id(frame), dropped when the frame returns so a reused id starts a new frame.
+        self.frames: dict[int, FrameState] = {}
+        self.filenames: dict[str, bool] = {}
+        # NOTE None for code whose locals are not fast locals, such as a module
+        self.line_names: dict[CodeType, dict[int, tuple[tuple[str, ...], tuple[str, ...]]] | None] = {}
+        self.thread = threading.get_ident()
+        self.monitoring = False
+        self.running = False
+
+    def included(self, filename: str) -> bool:
+        result = self.filenames.get(filename)
+        if result == None:
+            result = self.filenames[filename] = not (filename.startswith("<") or filename in self.exclude or filename.startswith(self.prefixes))
+        return result
+
+    def enter(self, frame: FrameType) -> FrameState:
+        parent = 0
+        back = frame.f_back
+        while back != None:
+            state = self.frames.get(id(back))
+            if state == None and self.included(back.f_code.co_filename):
+                state = self.enter(back)
+            if state != None:
+                parent = state.serial
+                break
+            back = back.f_back
+        code = frame.f_code
+        lines = self.line_names.get(code, ())
+        if lines == ():
+            lines = self.line_names[code] = line_names(code) if code.co_flags & inspect.CO_OPTIMIZED else None
+        state = self.frames[id(frame)] = FrameState(next(self.serials), parent, code.co_filename, code.co_name, lines)
+        return state
+
+    def on_line(self, frame: FrameType, lineno: int):
+        state = self.frames.get(id(frame))
+        if state == None: state = self.enter(frame)
+        values = state.values
+        changes: list[RecordedChange] | tuple = ()
+        first = None
+        if not state.recorded: # NOTE the first record of a frame in a chunk, also a generator resumed in a later chunk
+            first = (state.parent, state.filename, state.function, [(name, typename, text, truncated) for name, (_, _, typename, text, truncated) in values.items()])
+            state.recorded = True
+        # NOTE the line event comes before the line runs, so only the names of the line run last in this frame can
+        #      have changed. A value changed through an alias is seen at the next line using its name.
+        previous = state.lineno
+        state.lineno = lineno
+        lines = state.lines
+        scan = lines == None or not previous
+        names = ()
+        if not scan and previous in lines: # type: ignore
+            names, loaded = lines[previous] # type: ignore
+            for name in loaded:
+                last = values.get(name)
+                if last == None or type(last[0]) not in IDENTITY_TYPES: # NOTE those can only change by a store
+                    names = (*names, name)
+        if scan or names:
+            local_values = frame.f_locals # NOTE builds a dict of every local before 3.13, skipped for lines without any
+            changes = []
+            for name in local_values if scan else names: # type: ignore
+                if name not in local_values:
+                    if name in values:
+                        del values[name]
+                        changes.append(("-", name, "", "", False))
+                    continue
+                value = local_values[name]
+                last = values.get(name)
+                type_ = type(value)
+                if type_ in SCALAR_TYPES: # NOTE kept as is in the trace without a typename, the reader renders them
+                    if last != None and last[0] is value: continue
+                    values[name] = (value, 0, None, value, False)
+                    changes.append(("+" if last == None else "*", name, None, value, False))
+                    continue
+                if type_ in IDENTITY_TYPES:
+                    if last != None and last[0] is value: continue
+                    value_fingerprint = 0
+                else:
+                    value_fingerprint = fingerprint(value)
+                    if last != None and last[0] is value and last[1] == value_fingerprint and value_fingerprint != None: continue
+                typename = type_.__name__
+                text, truncated = self.render(value)
+                values[name] = (value, value_fingerprint, typename, text, truncated)
+                if last != None and value_fingerprint == None and last[0] is value and last[3] == text: continue # NOTE opaque value which did not change
+                changes.append(("+" if last == None else "*", name, typename, text, truncated))
+            if scan and len(values) != len(local_values):
+                for name in [name for name in values if name not in local_values]:
+                    del values[name]
+                    changes.append(("-", name, "", "", False))
+
+        records = self.records
+        if changes or first != None or state.serial != self.serial:
+            records.append((state.serial, lineno, changes, first))
+            self.serial = state.serial
+        else:
+            records.append(lineno)
+        steps = len(records)
+        if steps == 1:
+            self.keyframe = self.stack(frame)
+        elif steps == self.chunk_steps:
+            self.flush()
+
+    def stack(self, frame: FrameType | None) -> list[tuple[int, int, str, str, int, list[tuple[str, str | None, Any, bool]]]]:
+        stack = []
+        while frame != None:
+            state = self.frames.get(id(frame))
+            if state != None:
+                stack.append((state.serial, state.parent, state.filename, state.function, state.lineno, [(name, typename, text, truncated) for name, (_, _, typename, text, truncated) in state.values.items()]))
+            frame = frame.f_back
+        return stack
+
+    def flush(self):
+        if not self.records: return
+        body = marshal.dumps((self.keyframe, self.records))
+        self.file.write(CHUNK_HEADER.pack(len(body)))
+        self.file.write(body)
+        self.index.write(INDEX_ENTRY.pack(self.offset))
+        self.offset += CHUNK_HEADER.size + len(body)
+        self.steps += len(self.records)
+        self.records = []
+        for state in self.frames.values():
+            state.recorded = False
+
+    def on_return(self, frame: FrameType):
+        self.frames.pop(id(frame), None)
+
+    # NOTE sys.monitoring (PEP 669) calls back only for the enabled events and code which was not disabled,
+    #      so library code costs one callback per location before it is disabled.
+    def _monitor_line(self, code: CodeType, lineno: int):
+        if not self.included(code.co_filename): return sys.monitoring.DISABLE # type: ignore
+        if threading.get_ident() != self.thread: return
+        self.on_line(sys._getframe(1), lineno)
+
+    def _monitor_start(self, code: CodeType, offset: int):
+        if not self.included(code.co_filename): return sys.monitoring.DISABLE # type: ignore
+        self.frames.pop(id(sys._getframe(1)), None)
+
+    def _monitor_return(self, code: CodeType, offset: int, value: object):
+        if not self.included(code.co_filename): return sys.monitoring.DISABLE # type: ignore
+        self.on_return(sys._getframe(1))
+
+    def _monitor_unwind(self, code: CodeType, offset: int, exception: BaseException):
+        if self.included(code.co_filename): self.on_return(sys._getframe(1))
+
+    # NOTE Fallback before Python 3.12. Library frames get no local trace function, so only their calls are traced.
+    def _trace_global(self, frame: FrameType, event: str, arg: Any):
+        if event != "call" or not self.included(frame.f_code.co_filename): return None
+        self.frames.pop(id(frame), None)
+        return self._trace_local
+
+    def _trace_local(self, frame: FrameType, event: str, arg: Any):
+        if event == "line":
+            self.on_line(frame, frame.f_lineno)
+        elif event == "return":
+            self.on_return(frame)
+        return self._trace_local
+
+    def start(self, frame: FrameType | None):
+        """Record every line executed in the current thread from now on, starting at frame."""
+        self.running = True
+        monitoring = getattr(sys, "monitoring", None)
+        if monitoring != None:
+            tool = monitoring.DEBUGGER_ID
+            monitoring.use_tool_id(tool, "visualpy")
+            events = monitoring.events
+            monitoring.register_callback(tool, events.LINE, self._monitor_line)
+            monitoring.register_callback(tool, events.PY_START, self._monitor_start)
+            monitoring.register_callback(tool, events.PY_RETURN, self._monitor_return)
+            monitoring.register_callback(tool, events.PY_UNWIND, self._monitor_unwind)
+            monitoring.set_events(tool, events.LINE | events.PY_START | events.PY_RETURN | events.PY_UNWIND)
+            self.monitoring = True
+            return
+        while frame != None:
+            if self.included(frame.f_code.co_filename):
+                frame.f_trace = self._trace_local
+            frame = frame.f_back
+        sys.settrace(self._trace_global)
+
+    def stop(self):
+        if not self.running: return
+        self.running = False
+        if self.monitoring:
+            monitoring = sys.monitoring # type: ignore
+            monitoring.set_events(monitoring.DEBUGGER_ID, 0)
+            monitoring.free_tool_id(monitoring.DEBUGGER_ID)
+        else:
+            sys.settrace(None)
+        self.flush()
+        self.file.close()
+        self.index.close()
+        self.frames.clear()
+
+
+@dataclass
+class TraceFrame:
+    serial: int
+    parent: int
+    filename: str
+    function: str
+    lineno: int
+    values: dict[str, tuple[str, str, bool]] # name -> typename, value, truncated
+
+
+class TraceReader:
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.file = open(self.path, "rb")
+        magic, version, self.chunk_steps = TRACE_HEADER.unpack(self.file.read(TRACE_HEADER.size))
+        if magic != TRACE_MAGIC:
+            raise ValueError(f"{self.path} is not a visualpy trace.")
+        if version != TRACE_VERSION:
+            raise ValueError(f"Unsupported trace version {version} (expected {TRACE_VERSION}).")
+        self.index_file = open(index_path(self.path), "rb")
+        size = os.fstat(self.index_file.fileno()).st_size
+        self.index = mmap.mmap(self.index_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.chunks = size // INDEX_ENTRY.size
+        self.chunk_index = -1
+        self.chunk: tuple[list, list[tuple[int, int, list[RecordedChange], tuple | None] | int]] = ([], [])
+        self.frames: dict[int, TraceFrame] = {}
+        self.serial = 0 # NOTE of the last applied step, for records which are only a line number
+        self.position = -1
+        self.count = 0
+        while self.chunks:
+            try:
+                self.count = (self.chunks - 1) * self.chunk_steps + len(self.load(self.chunks - 1)[1])
+                break
+            except (EOFError, ValueError, struct.error): # NOTE recording was cut off
+                self.chunks -= 1
+
+    def __len__(self) -> int:
+        return self.count
+
+    def load(self, chunk_index: int) -> tuple[list, list[tuple[int, int, list[RecordedChange], tuple | None] | int]]:
+        if chunk_index != self.chunk_index:
+            self.file.seek(INDEX_ENTRY.unpack_from(self.index, chunk_index * INDEX_ENTRY.size)[0])
+            length, = CHUNK_HEADER.unpack(self.file.read(CHUNK_HEADER.size))
+            self.chunk = marshal.loads(self.file.read(length))
+            self.chunk_index = chunk_index
+        return self.chunk
+
+    def apply(self, step: int) -> tuple[int, list[Change]]:
+        keyframe, records = self.load(step // self.chunk_steps)
+        record = records[step % self.chunk_steps]
+        serial, lineno, recorded, first = (self.serial, record, (), None) if type(record) is int else record
+        self.serial = serial
+        changes: list[Change] = [(mode, name, *rendered(typename, text), truncated) for mode, name, typename, text, truncated in recorded]
+        if step % self.chunk_steps == 0:
+            self.frames = {
+                frame_serial: TraceFrame(frame_serial, parent, filename, function, frame_lineno, {name: (*rendered(typename, text), truncated) for name, typename, text, truncated in values})
+                for frame_serial, parent, filename, function, frame_lineno, values in keyframe
+            }
+        else:
+            frame = self.frames.get(serial)
+            if first != None:
+                parent, filename, function, values = first
+                frame = self.frames[serial] = TraceFrame(serial, parent, filename, function, lineno, {name: (*rendered(typename, text), truncated) for name, typename, text, truncated in values})
+            elif frame == None:
+                frame = self.frames[serial] = TraceFrame(serial, 0, "<unknown>", "<unknown>", lineno, {})
+            frame.lineno = lineno
+            for mode, name, typename, text, truncated in changes:
+                if mode == "-": frame.values.pop(name, None)
+                else: frame.values[name] = (typename, text, truncated)
+        self.position = step
+        return serial, changes
+
+    def step(self, step: int) -> tuple[list[TraceFrame], list[Change]]:
+        """Stack (innermost first) and changes of the given step."""
+        if not 0 <= step < self.count:
+            raise IndexError(f"Step {step} is out of the trace of {self.count} steps.")
+        # NOTE moving forward in the same chunk applies only the steps in between, otherwise starts from the keyframe.
+        chunk_start = step - step % self.chunk_steps
+        start = self.position + 1 if chunk_start <= self.position < step else chunk_start
+        for current in range(start, step):
+            self.apply(current)
+        serial, changes = self.apply(step)
+        stack: list[TraceFrame] = []
+        while serial in self.frames:
+            stack.append(self.frames[serial])
+            serial = self.frames[serial].parent
+        return stack, changes
+
+    def close(self):
+        if isinstance(self.index, mmap.mmap): self.index.close()
+        self.index_file.close()
+        self.file.close()
@@ -0,0 +1,117 @@
+import builtins
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import io
+import keyword
+import os
+import sys
+import tokenize
+from typing import Iterator
+
+
+SOURCE_CACHE_BYTES = 32 << 20
+SPAN_BYTES = 80 # NOTE rough cost of a span tuple and its list slot
+
+Span = tuple[int, int, str] # start column, end column, tag
+
+BUILTIN_NAMES = frozenset(dir(builtins))
+STRING_TOKENS = {tokenize.STRING, *(getattr(tokenize, name) for name in ("FSTRING_START", "FSTRING_MIDDLE", "FSTRING_END") if hasattr(tokenize, name))}
+
+
+@dataclass(slots=True)
+class Source:
+    path: str
+    stamp: tuple[int, int] # NOTE (mtime_ns, size) of the file when it was read
+    text: str
+    lines: list[str]
+    size: int
+    # NOTE highlight spans by line number, filled by advancing tokens only as far as lines are asked for
+    spans: dict[int, list[Span]] = field(default_factory=dict)
+    tokenized: int = 0
+    tokens: Iterator[tokenize.TokenInfo] | None = None
+    previous: str = "" # NOTE last significant token seen, to find the names of def and class
+
+
+def read_source(path: str) -> str:
+    with open(path, "rb") as file:
+        data = file.read()
+    try: encoding, _ = tokenize.detect_encoding(io.BytesIO(data).readline)
+    except SyntaxError: encoding = "utf-8"
+    return data.decode(encoding, errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+
+
+class SourceCache:
+    """Sources read from disk with their highlight spans, kept until the file changes or limit bytes are exceeded."""
+    def __init__(self, limit: int = SOURCE_CACHE_BYTES):
+        self.limit = limit
+        self.sources: OrderedDict[str, Source] = OrderedDict()
+        self.size = 0
+
+    def get(self, path: str) -> Source:
+        """The source of path, read again if the file changed since. Raises OSError if it can not be read."""
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        source = self.sources.get(path)
+        if source != None and source.stamp == stamp:
+            self.sources.move_to_end(path)
+            return source
+        if source != None: self.forget(path)
+        text = read_source(path)
+        lines = text.split("\n")
+        source = self.sources[path] = Source(path, stamp, text, lines, 2*sys.getsizeof(text) + sys.getsizeof(lines) + sum(map(sys.getsizeof, lines))) # NOTE the tokenizer holds a copy of text
+        source.tokens = tokenize.generate_tokens(io.StringIO(text).readline)
+        self.size += source.size
+        self.evict()
+        return source
+
+    def forget(self, path: str):
+        source = self.sources.pop(path, None)
+        if source != None: self.size -= source.size
+
+    def evict(self):
+        # NOTE the newest source stays even if it is larger than the limit alone
+        while self.size > self.limit and len(self.sources) > 1:
+            _, source = self.sources.popitem(last=False)
+            self.size -= source.size
+
+    def highlight(self, source: Source, last: int) -> dict[int, list[Span]]:
+        """Spans of every line up to last, tokenizing only the lines which were not asked for before."""
+        if source.tokenized >= last or source.tokens == None: return source.spans
+        added = 0
+        try:
+            for token in source.tokens:
+                (start_line, start_col), (end_line, end_col) = token.start, token.end
+                tag = token_tag(token, source.previous)
+                if token.type != tokenize.NL and token.type != tokenize.COMMENT: source.previous = token.string
+                if tag != None:
+                    # NOTE multi-line strings are cut into one span per line
+                    for line in range(start_line, end_line + 1):
+                        source.spans.setdefault(line, []).append((start_col if line == start_line else 0, end_col if line == end_line else len(source.lines[line-1]), tag))
+                        added += 1
+                source.tokenized = start_line - 1
+                if start_line > last: break
+            else:
+                source.tokens = None
+                source.tokenized = len(source.lines)
+        except (tokenize.TokenError, SyntaxError): # NOTE lines after the error are left plain
+            source.tokens = None
+            source.tokenized = len(source.lines)
+        if source.path in self.sources:
+            source.size += added * SPAN_BYTES
+            self.size += added * SPAN_BYTES
+            self.evict()
+        return source.spans
+
+
+def token_tag(token: tokenize.TokenInfo, previous: str) -> str | None:
+    if token.type == tokenize.NAME:
+        if previous in ("def", "class"): return "definition"
+        if keyword.iskeyword(token.string): return "keyword"
+        if token.string in BUILTIN_NAMES: return "builtin"
+        return None
+    if token.type in STRING_TOKENS: return "string"
+    if token.type == tokenize.COMMENT: return "comment"
+    if token.type == tokenize.NUMBER: return "number"
+    return None
+
+source_cache = SourceCache()
@@ -0,0 +1,30 @@
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.absolute()))
+from allocations import AllocationTracker # noqa: E402
+
+
+def test_stop_keeps_tracing_started_by_the_program():
+    tracemalloc.start()
+    try:
+        tracker = AllocationTracker()
+        tracker.start()
+        tracker.stop()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+def test_growth_is_measured_from_the_previous_stop():
+    tracker = AllocationTracker()
+    tracker.start()
+    try:
+        kept = [bytearray(1000) for _ in range(100)]
+        grown = {(filename, lineno): size for filename, lineno, size, _, _ in tracker.growth()}
+        assert grown.get((__file__, 23), 0) >= 100000
+        assert (__file__, 23) not in [(filename, lineno) for filename, lineno, *_ in tracker.growth()]
+    finally:
+        tracker.stop()
+    assert not tracemalloc.is_tracing()
+    assert kept
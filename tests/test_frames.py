@@ -0,0 +1,50 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.absolute()))
+from visualpy import Debug # noqa: E402
+
+
+def local_token(debugger: Debug, function: str, name: str) -> int:
+    for depth, frame in enumerate(debugger.data):
+        for loc in frame:
+            if loc.function == function and loc.name == name:
+                return debugger.states[depth][loc][1]
+    raise KeyError(name)
+
+def test_caller_local_mutated_by_callee_gets_new_token():
+    debugger = Debug()
+    tokens: list[int] = []
+    def scan():
+        debugger.curframe = sys._getframe(1)
+        debugger.update_frames()
+        tokens.append(local_token(debugger, "caller", "lst"))
+    def callee(lst: list[int]):
+        scan()
+        lst.append(1)
+        scan() # NOTE the frame of caller has not executed in between
+    def caller():
+        lst: list[int] = []
+        callee(lst)
+    caller()
+    assert tokens[0] != tokens[1]
+
+def test_caller_cell_rebound_by_callee_is_updated():
+    debugger = Debug()
+    values: list[object] = []
+    def scan():
+        debugger.curframe = sys._getframe(1)
+        debugger.update_frames()
+        depth, loc = next((depth, loc) for depth, frame in enumerate(debugger.data) for loc in frame if loc.function == "caller" and loc.name == "x")
+        values.append(debugger.data[depth][loc])
+    def caller():
+        x = 1
+        def callee():
+            nonlocal x
+            scan()
+            x = 2
+            scan()
+        callee()
+        return x
+    caller()
+    assert values == [1, 2]
@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.absolute()))
+from history import HISTORY_BYTES # noqa: E402
+from visualpy import Debug # noqa: E402
+
+
+def test_history_restarts_with_every_value():
+    debugger = Debug()
+    def scan():
+        debugger.curframe = sys._getframe(1)
+        debugger.update_frames()
+    def target():
+        debugger.set_history_limit(HISTORY_BYTES)
+        a = 1
+        scan()
+        debugger.set_history_limit(0)
+        b = 2
+        scan()
+        debugger.set_history_limit(HISTORY_BYTES)
+        c = 3
+        scan()
+        return a + b + c
+    target()
+    stack, frames, _ = debugger.history.state(len(debugger.history) - 1)
+    assert len(frames) == len(debugger.data)
+    for depth, values in enumerate(frames):
+        assert set(values) == {loc.name for loc in debugger.data[depth]}
+    assert frames[-1]["b"] == ("int", "2", False)
+
+def test_history_is_off_by_default():
+    debugger = Debug()
+    debugger.curframe = sys._getframe()
+    debugger.update_frames()
+    assert len(debugger.history) == 0
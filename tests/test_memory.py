@@ -0,0 +1,29 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.absolute()))
+from pympler import asizeof # noqa: E402
+
+from memory import SPLIT_ITEMS, MemoryMeter # noqa: E402
+
+
+def test_nested_value_after_split_container_is_sized_deep():
+    big = list(range(SPLIT_ITEMS * 5))
+    nested = {f"key{i}": {"values": [float(j) for j in range(50)]} for i in range(100)} # NOTE nothing shared with big
+    meter = MemoryMeter()
+    while True:
+        rows = meter.measure([(1, big), (2, nested)], budget=10.0)
+        if not meter.pending(): break
+    assert rows[1] == (asizeof.asizeof(nested), True)
+
+def test_changed_key_keeps_the_sizes_of_the_others():
+    values = [(i, [str(j) for j in range(i * 10)]) for i in range(50)]
+    meter = MemoryMeter()
+    meter.measure(values, budget=10.0)
+    assert not meter.pending()
+    changed = [str(j) for j in range(123)]
+    values[-1] = ("changed", changed)
+    rows = meter.measure(values, budget=0.0)
+    assert sum(exact for _, exact in rows) >= 49
+    while meter.pending(): rows = meter.measure(values, budget=10.0)
+    assert rows[-1] == (asizeof.asizeof(changed), True)
@@ -0,0 +1,60 @@
+import reprlib
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.absolute()))
+from recorder import Recorder, TraceReader # noqa: E402
+
+
+def render(value: object) -> tuple[str, bool]:
+    return reprlib.repr(value), False
+
+def mutate(items: list[int]):
+    items.append(1)
+
+def target() -> list[int]:
+    items: list[int] = []
+    mutate(items)
+    count = len(items)
+    del count
+    return items
+
+def test_recorded_values_follow_calls_and_deletes(tmp_path: Path):
+    recorder = Recorder(tmp_path / "target.vpt", render)
+    recorder.start(sys._getframe())
+    target()
+    recorder.stop()
+    reader = TraceReader(tmp_path / "target.vpt")
+    lines: dict[int, dict[str, tuple[str, str, bool]]] = {}
+    for step in range(len(reader)):
+        frame = reader.step(step)[0][0]
+        if frame.function == "target": lines[frame.lineno] = dict(frame.values)
+    reader.close()
+    first = target.__code__.co_firstlineno
+    assert lines[first + 3] == {"items": ("list", "[1]", False)}
+    assert lines[first + 4] == {"items": ("list", "[1]", False), "count": ("int", "1", False)}
+    assert lines[first + 5] == {"items": ("list", "[1]", False)}
+
+def loop() -> int:
+    total = 0
+    values = []
+    for i in range(50):
+        total += i * i
+        if i % 10 == 0: values.append(total)
+    return total
+
+def test_small_chunks_read_the_same_steps(tmp_path: Path):
+    def read(reader: TraceReader, step: int) -> list[tuple[int, dict[str, tuple[str, str, bool]]]]:
+        return [(frame.lineno, dict(frame.values)) for frame in reader.step(step)[0] if frame.function == "loop"]
+    steps = []
+    for chunk_steps in (3, 1024):
+        recorder = Recorder(tmp_path / f"{chunk_steps}.vpt", render, chunk_steps=chunk_steps)
+        recorder.start(sys._getframe())
+        loop()
+        recorder.stop()
+        reader = TraceReader(tmp_path / f"{chunk_steps}.vpt")
+        steps.append([read(reader, step) for step in range(len(reader))])
+        assert read(reader, len(reader) // 2) == steps[-1][len(reader) // 2]
+        reader.close()
+    assert steps[0] == steps[1]
+    assert [frames for frames in steps[0] if frames][-1][0][1]["total"] == ("int", str(loop()), False)
@@ -0,0 +1,127 @@
+import sys
+import tkinter as tk
+import tkinter.simpledialog as simpledialog
+import tkinter.ttk as ttk
+from typing import Protocol
+
+from recorder import Change, TraceFrame, TraceReader
+from sources import source_cache
+
+
+class StepReader(Protocol):
+    def __len__(self) -> int: ...
+    def step(self, step: int) -> tuple[list[TraceFrame], list[Change]]: ...
+    def close(self) -> None: ...
+
+
+class TraceView:
+    """Scrubs through recorded steps without running the program again.
+    The reader is a TraceReader of visualpy.debug(..., record=path) or the history of the debugger."""
+    def __init__(self, master: tk.Misc, reader: StepReader, title: str, step: int = -1):
+        self.reader = reader
+        self.window = tk.Toplevel(master)
+        self.window.title(title)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.filename: str | None = None
+        self.scheduled = False
+
+        controll_frame = tk.Frame(self.window)
+        controll_frame.pack(fill=tk.X, side=tk.TOP)
+        self.step = tk.IntVar(self.window, step % len(reader) if len(reader) else 0)
+        tk.Button(controll_frame, text="<", relief=tk.FLAT, command=lambda: self.move(-1)).pack(side=tk.LEFT)
+        tk.Button(controll_frame, text=">", relief=tk.FLAT, command=lambda: self.move(+1)).pack(side=tk.LEFT)
+        tk.Button(controll_frame, text="Go to", relief=tk.FLAT, command=self.ask_step).pack(side=tk.LEFT)
+        self.scale = tk.Scale(controll_frame, variable=self.step, from_=0, to=max(len(self.reader)-1, 0), orient=tk.HORIZONTAL, showvalue=False, command=lambda _: self.schedule())
+        self.scale.pack(fill=tk.X, side=tk.LEFT, expand=True)
+        self.step_label = tk.Label(controll_frame, text="", fg="#999999")
+        self.step_label.pack(side=tk.RIGHT)
+
+        panes = tk.PanedWindow(self.window, orient=tk.HORIZONTAL)
+        panes.pack(fill=tk.BOTH, expand=True)
+        self.tree = ttk.Treeview(panes, columns=("type", "value",))
+        self.tree.heading("#0", text="name")
+        self.tree.heading("type", text="type")
+        self.tree.heading("value", text="value")
+        self.tree.tag_configure("var_add", background="#baffc9")
+        self.tree.tag_configure("var_modify", background="#bae1ff")
+        self.tree.tag_configure("truncated", foreground="#7c3aed")
+        panes.add(self.tree)
+        self.code = tk.Text(panes)
+        self.code.tag_config("current", background="#bae1ff", foreground="blue")
+        self.code.config(state=tk.DISABLED)
+        panes.add(self.code)
+
+        self.window.bind("<Left>", lambda _: self.move(-1))
+        self.window.bind("<Right>", lambda _: self.move(+1))
+        self.show()
+
+    def move(self, delta: int):
+        self.jump(self.step.get() + delta)
+
+    def jump(self, step: int):
+        self.step.set(min(max(step, 0), max(len(self.reader)-1, 0)))
+        self.schedule()
+
+    def ask_step(self):
+        step = simpledialog.askinteger("Go to", f"Step (1 to {len(self.reader)})", initialvalue=self.step.get()+1, parent=self.window)
+        if step != None: self.jump(step - 1)
+
+    def update_range(self):
+        self.scale.config(to=max(len(self.reader)-1, 0))
+
+    # NOTE Dragging the scale fires for every pixel, only the last position is shown.
+    def schedule(self):
+        if self.scheduled: return
+        self.scheduled = True
+        self.window.after_idle(self.show)
+
+    def source(self, filename: str) -> str:
+        try: return source_cache.get(filename).text
+        except OSError: return ""
+
+    def show(self):
+        self.scheduled = False
+        if not len(self.reader):
+            self.step_label.config(text="empty trace")
+            return
+        step = self.step.get()
+        try: stack, changes = self.reader.step(step)
+        except (IndexError, ValueError) as e:
+            self.step_label.config(text=str(e))
+            return
+        self.step_label.config(text=f"step {step+1} / {len(self.reader)}")
+        modes = {name: mode for mode, name, _, _, _ in changes}
+
+        self.tree.delete(*self.tree.get_children())
+        for depth, frame in enumerate(stack):
+            frame_id = self.tree.insert("", tk.END, text=f"File {frame.filename}, line {frame.lineno}, in {frame.function}", open=depth == 0)
+            for name, (typename, value, truncated) in frame.values.items():
+                tag = {"+": "var_add", "*": "var_modify"}.get(modes.get(name, ""), "") if depth == 0 else ""
+                self.tree.insert(frame_id, tk.END, text=name, values=(typename, value), tags=tuple(t for t in (tag, "truncated" if truncated else "") if t))
+
+        if not stack: return
+        current = stack[0]
+        self.code.config(state=tk.NORMAL)
+        if current.filename != self.filename:
+            self.filename = current.filename
+            self.code.delete("1.0", tk.END)
+            self.code.insert(tk.END, self.source(current.filename))
+        self.code.tag_remove("current", "1.0", tk.END)
+        self.code.tag_add("current", f"{current.lineno}.0", f"{current.lineno+1}.0")
+        self.code.config(state=tk.DISABLED)
+        self.code.see(f"{current.lineno}.0")
+
+    def close(self):
+        self.reader.close()
+        self.window.destroy()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python traceview.py <trace>")
+        exit(1)
+    root = tk.Tk()
+    root.withdraw()
+    view = TraceView(root, TraceReader(sys.argv[1]), f"trace {sys.argv[1]}")
+    view.window.bind("<Destroy>", lambda event: root.destroy() if event.widget is view.window else None)
+    root.mainloop()
@@ -0,0 +1,70 @@
+from array import array
+from collections import deque
+import ctypes
+import sys
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+import zlib
+
+
+# NOTE Identity is enough to notice a change of these values.
+IDENTITY_TYPES: set[type] = {
+    type(None), bool, int, float, complex, str, bytes, range, tuple, frozenset,
+    type, ModuleType, FunctionType, BuiltinFunctionType, MethodType
+}
+
+
+# NOTE On CPython the items of a list are one array of pointers (ob_item), so their identities can be
+#      checksummed at memory speed instead of creating an int per element with id().
+_POINTER_SIZE = ctypes.sizeof(ctypes.c_void_p)
+_LIST_ITEMS_OFFSET = list.__basicsize__ - 2*_POINTER_SIZE
+_READ_LIST_ITEMS = sys.implementation.name == "cpython"
+# NOTE Comparing a copy of the items (memcmp) is several times faster than checksumming it,
+#      so lists up to this many bytes of pointers keep the copy itself as the fingerprint.
+_SNAPSHOT_BYTES = 1 << 16
+
+def _list_fingerprint(value: list) -> int | bytes:
+    if not _READ_LIST_ITEMS:
+        return hash((len(value), tuple(map(id, value))))
+    items = ctypes.c_void_p.from_address(id(value) + _LIST_ITEMS_OFFSET).value
+    if not items: return 0
+    # NOTE copy with bytes() first, zlib releases the GIL while another thread could resize the list.
+    snapshot = bytes((ctypes.c_char * (len(value)*_POINTER_SIZE)).from_address(items))
+    return snapshot if len(snapshot) <= _SNAPSHOT_BYTES else zlib.crc32(snapshot)
+
+# NOTE Contents of buffers up to this size are checksummed. Larger ones are opaque, their summary does not depend on the contents anyway.
+_CHECKSUM_BYTES = 16 << 20
+BUFFER_TYPES: set[type] = {bytearray, array, memoryview}
+
+def is_buffer(value: object) -> bool:
+    if type(value) in BUFFER_TYPES: return True
+    numpy = sys.modules.get("numpy") # NOTE only if the program uses numpy already
+    return numpy != None and isinstance(value, numpy.ndarray)
+
+def _buffer_fingerprint(value: object) -> int | None:
+    try: view = memoryview(value) # type: ignore
+    except (TypeError, ValueError, BufferError): return None # NOTE e.g. numpy arrays of objects
+    with view:
+        if view.nbytes > _CHECKSUM_BYTES or not view.c_contiguous: return None
+        return hash((view.shape, view.format, zlib.adler32(view)))
+
+def fingerprint(value: object) -> int | bytes | None:
+    """Cheap shallow fingerprint of a value, compared between steps to detect in-place mutation.
+    None means the value is opaque and may have changed."""
+    type_ = type(value)
+    if type_ in IDENTITY_TYPES:
+        return 0
+    if type_ is list:
+        return _list_fingerprint(value) # type: ignore
+    if type_ is deque:
+        return hash((len(value), tuple(map(id, value)))) # type: ignore
+    if type_ is dict:
+        return hash((len(value), tuple(map(id, value)), tuple(map(id, value.values())))) # type: ignore
+    if type_ is set:
+        return hash((len(value), frozenset(map(id, value)))) # type: ignore
+    if type_ in BUFFER_TYPES:
+        return _buffer_fingerprint(value)
+    try: attributes = object.__getattribute__(value, "__dict__")
+    except Exception: return _buffer_fingerprint(value) if is_buffer(value) else None
+    if type(attributes) is not dict:
+        return None
+    return hash((type_, tuple(map(id, attributes)), tuple(map(id, attributes.values()))))
@@ -1,13 +1,23 @@
+import bisect
 from dataclasses import dataclass, field
 from functools import lru_cache
-from io import TextIOWrapper
+import itertools
+from io import BufferedReader, BufferedWriter
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import os
 from pathlib import Path
 import pickle
+import pprint
+import queue
+import shlex
 from subprocess import Popen, PIPE
 import sys
+import threading
+import time
 import traceback
 from types import ModuleType, TracebackType
-from typing import Any, Callable, Generic, Mapping, ParamSpec, Sequence, TypeVar, cast
+from typing import Any, Callable, Generic, Literal, Mapping, ParamSpec, Sequence, TypeVar, cast
 
 
 def excepthook(exc_type: type[BaseException], exc_value: BaseException, exc_traceback: TracebackType | None):
@@ -33,9 +43,17 @@ import tkinter as tk
 import tkinter.font as tkfont
 import tkinter.ttk as ttk
 import tkinter.messagebox as msgbox
+import tkinter.filedialog as filedialog
 import tkinter.scrolledtext as sttk
+import tkinter.simpledialog as simpledialog
 import tksvg #type: ignore
 
+from latency import METRICS, PERCENTILES, LatencyStats, Sample
+from protocol import KIND_FAILURE, Message, Reader
+from recorder import Change, TraceFrame, TraceReader
+from sources import Source, source_cache
+from traceview import TraceView
+
 
 
 
@@ -69,6 +87,8 @@ _icon_list: list[tuple[str, str]] = [
     ("symbol-namespace", "#dd9623"),
     
     ("debug-step-over", "#75beff"),
+    ("debug-continue", "#75beff"),
+    ("debug-step-back", "#75beff"),
     ("debug-stop", "#f48771"),
     
     ("send", "#999999"),
@@ -126,10 +146,17 @@ dataview_tree.tag_configure("var_modify", background="#bae1ff")
 dataview_tree.tag_configure("var_remove", background="#ffb3ba")
 dataview_tree.tag_configure("frame_remove", background="#ff0000")
 dataview_tree.tag_configure("builtin", foreground="gray")
+dataview_tree.tag_configure("truncated", foreground="#7c3aed")
+dataview_tree.tag_configure("more", foreground="gray")
 dataview_tree.pack(fill=tk.BOTH, side=tk.LEFT, expand=True)
 dataview_scroll = tk.Scrollbar(dataview_frame, command=dataview_tree.yview)
 dataview_scroll.pack(fill=tk.Y, side=tk.RIGHT)
-dataview_tree.config(yscrollcommand=dataview_scroll.set)
+def __dataview_ysc(first: float, last: float):
+    dataview_scroll.set(first, last)
+    schedule_fetch_values()
+dataview_tree.config(yscrollcommand=__dataview_ysc)
+dataview_tree.bind("<<TreeviewOpen>>", lambda _: schedule_fetch_values())
+dataview_tree.bind("<Configure>", lambda _: schedule_fetch_values())
 @dataclass(frozen=True)
 class FrameInfo:
     filename: str
@@ -151,9 +178,13 @@ class VariableInfo:
     def __post_init__(self):
         object.__setattr__(self, "path", self.name)
     
-dataview_tree_variable_id_stack: list[VariableInfo] = []
 dataview_tree_variable_to_retag: list[tuple[str, str]] = []
 dataview_tree_variable_will_remove: list[str] = []
+# NOTE Values are fetched only for rows on screen. A row is stale while its change token differs from the fetched one.
+dataview_tree_variable_token: dict[str, int] = {}
+dataview_tree_variable_fetched: dict[str, int] = {}
+dataview_tree_variable_fetching: dict[str, int] = {}
+dataview_tree_variable_truncated: set[str] = set()
 
 @dataclass(frozen=True)
 class AttributeInfo:
@@ -163,21 +194,165 @@ class AttributeInfo:
     
     id: str
     name: str
-dataview_tree_attribute_info_list: list[AttributeInfo] = []
-
 
+class TreeModel:
+    # NOTE Indexes of the items in dataview_tree, updated together with every insert and delete of the tree.
+    #      Frames are children of "", variables of their frame and attributes of their variable or attribute.
+    def __init__(self):
+        self.infos: dict[str, FrameInfo | VariableInfo | AttributeInfo] = {}
+        self.variables: dict[tuple[int, str], VariableInfo] = {}
+        self.attributes: dict[str, AttributeInfo] = {}
+        self.parents: dict[str, str] = {}
+        self.children: dict[str, dict[str, None]] = {}
+
+    def add(self, info: FrameInfo | VariableInfo | AttributeInfo, parent: str = ""):
+        self.infos[info.id] = info
+        self.parents[info.id] = parent
+        self.children.setdefault(parent, {})[info.id] = None
+        if type(info) == VariableInfo: self.variables[(info.depth, info.name)] = info
+        elif type(info) == AttributeInfo: self.attributes[info.id] = info
+
+    def replace(self, info: FrameInfo):
+        self.infos[info.id] = info
+
+    def variable(self, depth: int, name: str) -> VariableInfo | None:
+        return self.variables.get((depth, name))
+
+    def forget_variable(self, info: VariableInfo):
+        # NOTE the row stays until it is deleted, but a new variable of the same name may come in the meantime
+        if self.variables.get((info.depth, info.name)) is info:
+            del self.variables[(info.depth, info.name)]
+
+    def descendants(self, id_: str) -> list[str]:
+        result: list[str] = []
+        pending = [id_]
+        while pending:
+            for child in self.children.get(pending.pop(), ()):
+                result.append(child)
+                pending.append(child)
+        return result
+
+    def remove(self, id_: str, keep_self: bool = False) -> list[str]:
+        """Remove the descendants of id_ (and id_ unless keep_self). Returns the removed ids."""
+        removed = self.descendants(id_) if keep_self else [id_, *self.descendants(id_)]
+        for target in removed:
+            info = self.infos.pop(target, None)
+            parent = self.parents.pop(target, None)
+            self.children.pop(target, None)
+            if parent != None and parent in self.children:
+                self.children[parent].pop(target, None)
+            if type(info) == VariableInfo: self.forget_variable(info)
+            elif type(info) == AttributeInfo: del self.attributes[target]
+        return removed
+
+dataview_model = TreeModel()
 
 def idToInfo(id: str):
-    for fi in dataview_tree_frame_id_stack:
-        if fi.id == id:
-            return fi
-    for vi in dataview_tree_variable_id_stack:
-        if vi.id == id:
-            return vi
-    for ai in dataview_tree_attribute_info_list:
-        if ai.id == id:
-            return ai
-    return None
+    return dataview_model.infos.get(id)
+
+# NOTE Children past the first page of an item are kept out of the tree and inserted a page at a time,
+#      from a "show next" row at the end which is expanded once it scrolls into view.
+#      Children of attributes are not sent by the debugger at once either, the next page is fetched when needed.
+DATAVIEW_PAGE_ROWS = 200
+@dataclass
+class PendingRows:
+    more: str
+    rows: dict[str, dict[str, Any]] # NOTE iid -> options of dataview_tree.insert, in order
+    remote: int = 0 # NOTE children the debugger has not sent yet
+    fetch: Callable[[], None] | None = None
+    fetching: bool = False
+dataview_tree_pending: dict[str, PendingRows] = {} # NOTE parent -> rows not inserted yet
+dataview_tree_pending_parent: dict[str, str] = {}
+dataview_tree_more: dict[str, str] = {} # NOTE "show next" row -> parent
+dataview_tree_more_dirty: set[str] = set()
+dataview_tree_row_ids = itertools.count()
+
+def new_row_id() -> str:
+    return f"row{next(dataview_tree_row_ids)}"
+
+def pending_rows(parent: str) -> PendingRows:
+    pending = dataview_tree_pending.get(parent)
+    if pending == None:
+        pending = dataview_tree_pending[parent] = PendingRows(dataview_tree.insert(parent, tk.END, tags="more"), {})
+        dataview_tree_more[pending.more] = parent
+    return pending
+
+def insert_row(parent: str, iid: str, **options: Any):
+    if parent not in dataview_tree_pending and len(dataview_model.children.get(parent, ())) <= DATAVIEW_PAGE_ROWS:
+        dataview_tree.insert(parent, tk.END, iid=iid, **options)
+        return
+    pending = pending_rows(parent)
+    pending.rows[iid] = options
+    dataview_tree_pending_parent[iid] = parent
+    dataview_tree_more_dirty.add(parent)
+
+def expect_rows(parent: str, remote: int, fetch: Callable[[], None]):
+    if remote > 0:
+        pending = pending_rows(parent)
+        pending.remote, pending.fetch, pending.fetching = remote, fetch, False
+        dataview_tree_more_dirty.add(parent)
+    elif parent in dataview_tree_pending:
+        pending = dataview_tree_pending[parent]
+        pending.remote, pending.fetch = 0, None
+        if pending.rows: dataview_tree_more_dirty.add(parent)
+        else: drop_pending_parent(parent)
+
+def update_row(iid: str, **options: Any):
+    parent = dataview_tree_pending_parent.get(iid)
+    if parent == None: dataview_tree.item(iid, **options)
+    else: dataview_tree_pending[parent].rows[iid].update(options)
+
+def row_value(iid: str) -> str:
+    parent = dataview_tree_pending_parent.get(iid)
+    if parent == None: return dataview_tree.set(iid, "value")
+    return dataview_tree_pending[parent].rows[iid]["values"][1]
+
+def drop_pending(ids: list[str]):
+    for id_ in ids:
+        parent = dataview_tree_pending_parent.pop(id_, None)
+        if parent != None:
+            pending = dataview_tree_pending[parent]
+            del pending.rows[id_]
+            dataview_tree_more_dirty.add(parent)
+            if not pending.rows and not pending.remote: drop_pending_parent(parent)
+        if id_ in dataview_tree_pending: drop_pending_parent(id_)
+
+def drop_pending_parent(parent: str):
+    pending = dataview_tree_pending.pop(parent)
+    for iid in pending.rows: del dataview_tree_pending_parent[iid]
+    del dataview_tree_more[pending.more]
+    dataview_tree_more_dirty.discard(parent)
+    if dataview_tree.exists(pending.more): dataview_tree.delete(pending.more)
+
+def delete_row(iid: str):
+    inserted = iid not in dataview_tree_pending_parent
+    removed = dataview_model.remove(iid)
+    drop_pending(removed)
+    if inserted: dataview_tree.delete(iid)
+
+def show_more_rows(parent: str):
+    pending = dataview_tree_pending.get(parent)
+    if pending == None: return
+    if not pending.rows:
+        if pending.fetch != None and not pending.fetching:
+            pending.fetching = True
+            pending.fetch()
+        return
+    index = dataview_tree.index(pending.more)
+    for iid in list(itertools.islice(pending.rows, DATAVIEW_PAGE_ROWS)):
+        del dataview_tree_pending_parent[iid]
+        dataview_tree.insert(parent, index, iid=iid, **pending.rows.pop(iid))
+        index += 1
+    if pending.rows or pending.remote: dataview_tree_more_dirty.add(parent)
+    else: drop_pending_parent(parent)
+    schedule_fetch_values()
+
+def label_more_rows():
+    for parent in dataview_tree_more_dirty:
+        pending = dataview_tree_pending[parent]
+        left = len(pending.rows) + pending.remote
+        dataview_tree.item(pending.more, text=f"show next {min(left, DATAVIEW_PAGE_ROWS)} of {left}")
+    dataview_tree_more_dirty.clear()
 
 
 ####################################################################################################
@@ -186,13 +361,19 @@ def idToInfo(id: str):
 controllbar_frame = tk.Frame(root_grid1)
 controllbar_frame.pack(fill=tk.X, side=tk.BOTTOM)
 
+controllbar_step_back_button = tk.Button(controllbar_frame, relief=tk.FLAT, image=iconImage["debug-step-back"])
+controllbar_step_back_button.pack(side=tk.LEFT)
 controllbar_step_over_button = tk.Button(controllbar_frame, relief=tk.FLAT, image=iconImage["debug-step-over"])
 controllbar_step_over_button.pack(side=tk.LEFT)
+controllbar_continue_button = tk.Button(controllbar_frame, relief=tk.FLAT, image=iconImage["debug-continue"])
+controllbar_continue_button.pack(side=tk.LEFT)
 controllbar_stop_button = tk.Button(controllbar_frame, relief=tk.FLAT, image=iconImage["debug-stop"])
 controllbar_stop_button.pack(side=tk.LEFT)
 controllbar_log_in_terminal = tk.BooleanVar(controllbar_frame, False)
 controllbar_log_in_terminal_checkbox = tk.Checkbutton(controllbar_frame, variable=controllbar_log_in_terminal, text="Log in terminal")
 controllbar_log_in_terminal_checkbox.pack(side=tk.LEFT)
+controllbar_state_label = tk.Label(controllbar_frame, text="", fg="#999999")
+controllbar_state_label.pack(side=tk.RIGHT)
 
 ####################################################################################################
 
@@ -202,7 +383,174 @@ codeview_frame.pack(fill=tk.BOTH)
 
 codeview_notebook = ttk.Notebook(codeview_frame)
 codeview_notebook.pack(fill=tk.BOTH, expand=True)
-codeview_stacks: list[tuple[tk.Frame, tk.Text, tk.Text, tk.Scrollbar]] = []
+# NOTE (filename, line) -> condition of breakpoints stored in the debugger. Click the line numbers to toggle, right click to set a condition.
+codeview_breakpoints: dict[tuple[str, int], str | None] = {}
+
+CODEVIEW_POOL = 8
+CODEVIEW_CHUNK_LINES = 400
+CODEVIEW_ALLOCATION_COLORS = ["#efe4ff", "#dcc6ff", "#c3a0ff"] # NOTE growth over 1 KiB, 1 MiB and 64 MiB
+CODEVIEW_ALLOCATION_LEVELS = [1 << 10, 1 << 20, 64 << 20]
+CODEVIEW_PROFILE_COLORS = ["#fff1f0", "#ffdcd6", "#ffc2b8", "#ffa394", "#ff8270"] # NOTE by self time relative to the hottest line
+CODEVIEW_SYNTAX_COLORS = {"keyword": "#af00db", "builtin": "#267f99", "definition": "#795e26", "string": "#a31515", "comment": "#008000", "number": "#098658"}
+
+def format_memory(size: int) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB": break
+        size /= 1024 # type: ignore
+    return f"{size} B" if unit == "B" else f"{size:.1f} {unit}"
+
+def code_source(filename: str) -> Source | None:
+    try: return source_cache.get(filename)
+    except OSError: return None
+
+class CodeView:
+    # NOTE One view per file, shared by every frame in it. Lines are empty until they come near the screen,
+    #      then the source is inserted a chunk of lines at a time.
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.source = code_source(filename)
+        self.lines = self.source.lines if self.source != None else [""]
+        self.rendered: set[int] = set()
+        self.scheduled = False
+        
+        self.frame = tk.Frame(codeview_notebook)
+        self.frame.pack(fill=tk.X, side=tk.BOTTOM, expand=True)
+        
+        self.lineno_area = tk.Text(self.frame, width=max(len(str(len(self.lines))), 3), bg="lightgray")
+        self.lineno_area.insert(tk.END, "\n".join(map(str, range(1, len(self.lines)+1))))
+        self.lineno_area.config(state=tk.DISABLED)
+        for level, color in enumerate(CODEVIEW_ALLOCATION_COLORS): self.lineno_area.tag_config(f"allocation{level}", background=color) # NOTE below breakpoints
+        self.lineno_area.tag_config("breakpoint", background="#f48771")
+        self.lineno_area.tag_config("breakpoint_condition", background="#e79428")
+        self.lineno_area.pack(fill=tk.Y, side=tk.LEFT)
+        def __gutter_line(event: "tk.Event[tk.Text]") -> int:
+            return int(event.widget.index(f"@{event.x},{event.y}").split(".")[0])
+        self.lineno_area.bind("<Button-1>", lambda e: toggle_breakpoint(filename, __gutter_line(e)))
+        self.lineno_area.bind("<Button-3>", lambda e: ask_breakpoint_condition(filename, __gutter_line(e)))
+        self.allocations: dict[int, tuple[int, int, int]] = {} # NOTE lineno -> size grown, blocks grown, size now
+        self.allocation_label = tk.Label(self.frame, bg="#ffffe0", relief=tk.SOLID, borderwidth=1)
+        def __show_allocation(event: "tk.Event[tk.Text]"):
+            lineno = __gutter_line(event)
+            if lineno not in self.allocations:
+                self.allocation_label.place_forget()
+                return
+            grown, blocks, size = self.allocations[lineno]
+            self.allocation_label.config(text=f"line {lineno}: +{format_memory(grown)} in {blocks:+} blocks, {format_memory(size)} allocated")
+            self.allocation_label.place(x=self.lineno_area.winfo_width(), y=event.y)
+        self.lineno_area.bind("<Motion>", __show_allocation)
+        self.lineno_area.bind("<Leave>", lambda _: self.allocation_label.place_forget())
+        
+        self.code_area = tk.Text(self.frame)
+        for tag, color in CODEVIEW_SYNTAX_COLORS.items(): self.code_area.tag_config(tag, foreground=color)
+        for level, color in enumerate(CODEVIEW_PROFILE_COLORS): self.code_area.tag_config(f"hot{level}", background=color) # NOTE below the frame lines
+        self.code_area.tag_config("caller", background="#e6f2ff")
+        self.code_area.tag_config("current", background="#bae1ff", foreground="blue")
+        self.code_area.insert(tk.END, "\n" * (len(self.lines)-1))
+        self.code_area.config(state=tk.DISABLED)
+        self.code_area.pack(fill=tk.BOTH, side=tk.LEFT)
+        
+        self.scroll = tk.Scrollbar(self.frame)
+        self.scroll.pack(fill=tk.Y, side=tk.LEFT)
+        
+        def __ysc(first: float, last: float):
+            self.lineno_area.yview_moveto(first)
+            self.scroll.set(first, last)
+            self.schedule_render()
+        self.code_area.config(yscrollcommand=__ysc)
+        def __scroll_cmd(*args: tuple[Any]):
+            self.lineno_area.yview(*args)
+            self.code_area.yview(*args)
+        self.scroll.config(command=__scroll_cmd)
+        
+        codeview_notebook.add(self.frame, text=Path(filename).name)
+    
+    def render(self, first: int, last: int):
+        self.code_area.config(state=tk.NORMAL)
+        for chunk in range(max(first-1, 0) // CODEVIEW_CHUNK_LINES, min(last, len(self.lines)) // CODEVIEW_CHUNK_LINES + 1):
+            start = chunk * CODEVIEW_CHUNK_LINES
+            if chunk in self.rendered or start >= len(self.lines): continue
+            self.rendered.add(chunk)
+            lines = self.lines[start:start+CODEVIEW_CHUNK_LINES]
+            # NOTE the empty lines of the chunk are replaced by as many lines, the numbering below does not move
+            self.code_area.delete(f"{start+1}.0", f"{start+len(lines)}.0")
+            self.code_area.insert(f"{start+1}.0", "\n".join(lines))
+            self.highlight(start+1, start+len(lines))
+        self.code_area.config(state=tk.DISABLED)
+    
+    def highlight(self, first: int, last: int):
+        if self.source == None: return
+        spans = source_cache.highlight(self.source, last)
+        indexes: dict[str, list[str]] = {}
+        for line in range(first, last+1):
+            for start, end, tag in spans.get(line, ()):
+                indexes.setdefault(tag, []).extend((f"{line}.{start}", f"{line}.{end}"))
+        for tag, ranges in indexes.items(): self.code_area.tag_add(tag, *ranges) # NOTE one call per tag for the whole chunk
+    
+    def schedule_render(self):
+        if self.scheduled: return
+        self.scheduled = True
+        self.code_area.after_idle(self.render_visible)
+    
+    def render_visible(self):
+        self.scheduled = False
+        first = int(self.code_area.index("@0,0").split(".")[0])
+        last = int(self.code_area.index(f"@0,{self.code_area.winfo_height()}").split(".")[0])
+        self.render(first - CODEVIEW_CHUNK_LINES//2, last + CODEVIEW_CHUNK_LINES//2)
+    
+    def mark_allocations(self, growths: list[tuple[int, int, int, int]]):
+        """Color the gutter of lines whose allocations grew since the last stop."""
+        for level in range(len(CODEVIEW_ALLOCATION_COLORS)): self.lineno_area.tag_remove(f"allocation{level}", "1.0", tk.END)
+        self.allocations = {lineno: (grown, blocks, size) for lineno, grown, blocks, size in growths}
+        for lineno, (grown, _, _) in self.allocations.items():
+            level = bisect.bisect_right(CODEVIEW_ALLOCATION_LEVELS, grown) - 1
+            if level >= 0: self.lineno_area.tag_add(f"allocation{level}", f"{lineno}.0", f"{lineno+1}.0")
+
+    def mark_profile(self, lines: list[tuple[int, float]], hottest: float):
+        """Color lines by their self time, hottest being the largest self time of any file."""
+        for level in range(len(CODEVIEW_PROFILE_COLORS)): self.code_area.tag_remove(f"hot{level}", "1.0", tk.END)
+        if hottest <= 0: return
+        indexes: dict[int, list[str]] = {}
+        for lineno, wall in lines:
+            if wall <= 0: continue
+            level = min(int(wall / hottest * len(CODEVIEW_PROFILE_COLORS)), len(CODEVIEW_PROFILE_COLORS)-1)
+            indexes.setdefault(level, []).extend((f"{lineno}.0", f"{lineno+1}.0"))
+        for level, ranges in indexes.items(): self.code_area.tag_add(f"hot{level}", *ranges)
+
+    def mark(self, ranges: list[tuple[int, int]]):
+        """Highlight the lines of the frames in this file, innermost first."""
+        self.code_area.tag_remove("current", "1.0", tk.END)
+        self.code_area.tag_remove("caller", "1.0", tk.END)
+        for lineno, end_lineno in ranges: self.render(lineno, end_lineno)
+        for i, (lineno, end_lineno) in enumerate(ranges):
+            self.code_area.tag_add("caller" if i else "current", f"{lineno}.0", f"{end_lineno+1}.0")
+        lineno = ranges[0][0]
+        self.lineno_area.mark_set("insert", f"{lineno}.0")
+        self.lineno_area.see("insert")
+        self.code_area.mark_set("insert", f"{lineno}.0")
+        self.code_area.see("insert")
+
+# NOTE views of the files on the stack have a tab, the others are kept hidden for a while, ordered by last use
+codeview_files: dict[str, CodeView] = {}
+
+def show_code_views(filenames: list[str]):
+    for filename in filenames:
+        view = codeview_files.pop(filename, None)
+        source = code_source(filename)
+        if view != None and (view.source and view.source.stamp) != (source and source.stamp): # NOTE the file changed on disk
+            codeview_notebook.forget(view.frame)
+            view.frame.destroy()
+            view = None
+        codeview_files[filename] = view or CodeView(filename)
+        if view == None: paint_breakpoints(filename)
+        else: codeview_notebook.add(view.frame) # NOTE shows the tab again if it was hidden
+    for filename, view in list(codeview_files.items()):
+        if filename in filenames: continue
+        if len(codeview_files) > CODEVIEW_POOL:
+            del codeview_files[filename]
+            codeview_notebook.forget(view.frame)
+            view.frame.destroy()
+        else:
+            codeview_notebook.hide(view.frame)
 
 
 ####################################################################################################
@@ -214,6 +562,7 @@ terminalview_frame.pack(fill=tk.BOTH, expand=True)
 terminalview_scrolledtext = sttk.ScrolledText(terminalview_frame)
 terminalview_scrolledtext.tag_config('system', foreground="blue")
 terminalview_scrolledtext.tag_config('user', foreground="red")
+terminalview_scrolledtext.tag_config('failure', foreground="#f48771")
 terminalview_scrolledtext.pack(fill=tk.BOTH, side=tk.TOP)
 terminalview_scrolledtext.yview_moveto(1)
 
@@ -266,10 +615,6 @@ menubar.add_command(label="License", command=license_window.deiconify)
 
 P = ParamSpec("P")
 V = TypeVar("V")
-def thread(func: Callable[P, V]) -> Callable[P, None]:
-    def decorator(*args: P.args, **kwards: P.kwargs) -> None:
-        root.after(1, lambda: func(*args, **kwards))
-    return decorator
 
 argv = sys.orig_argv.copy()
 argv.pop(1)
@@ -277,210 +622,666 @@ argv.append("Visual.py-subprocess")
 proc = Popen(
 	argv,
     stdin = PIPE,
-    stdout = PIPE,
-    text=True
+    stdout = PIPE
 )
+assert type(proc.stdout) == BufferedReader
+proc_reader = Reader(proc.stdout)
 
-def _communicate(callback: Callable[[str], Any], *args: str, callback_closed: Callable[[], Any] | None = None, log_in_termianl: bool = False, tag: str = "system"):
-    assert type(proc.stdin) == TextIOWrapper
-    assert type(proc.stdout) == TextIOWrapper
-    move_end = terminalview_scrolledtext.yview()[1] == 1
-    for s in args:
-        if log_in_termianl: terminalview_scrolledtext.insert(tk.END, s+"\n", tag)
-        proc.stdin.write(s+'\n')
-        proc.stdin.flush()
-        
+@dataclass
+class Request:
+    command: str
+    callback: Callable[[Any], Any]
+    callback_closed: Callable[[], Any] | None = None
+    callback_failed: Callable[[str], Any] | None = None
+    log_in_termianl: bool = False
+    resume: bool = False # NOTE the target runs until the reply of this request
+    channel: str | None = None # NOTE a newer request on the same channel supersedes older ones
+    
+    id: int = field(default=0, init=False)
+    sent: float = field(default=0.0, init=False)
+    superseded: bool = field(default=False, init=False)
+    waiter: threading.Event | None = field(default=None, init=False)
+    reply: Message | None = field(default=None, init=False)
+
+# NOTE Replies are read in proc_reader_thread and handed to tk through proc_events, drained by drain_events.
+#      Each command is sent as "@<id> <command>" and the reply carries the same id.
+proc_request_ids = itertools.count(1)
+proc_requests: dict[int, Request] = {}
+proc_requests_lock = threading.Lock()
+proc_channel_in_flight: dict[str, Request] = {}
+proc_channel_waiting: dict[str, Request] = {}
+proc_events: "queue.Queue[tuple[Literal['output'], bytes] | tuple[Literal['reply'], tuple[Request | None, Message]] | tuple[Literal['closed'], None]]" = queue.Queue()
+
+def _read_replies():
+    def on_output(data: bytes):
+        proc_events.put(("output", data))
+    try:
+        while (message := proc_reader.read(on_output)) != None:
+            with proc_requests_lock:
+                request = proc_requests.pop(message.request_id, None)
+            if request and request.waiter:
+                request.reply = message
+                request.waiter.set()
+                continue
+            proc_events.put(("reply", (request, message)))
+    except Exception: # NOTE a broken frame, such as the magic printed by the program, the replies can not be followed anymore
+        print("Reading replies of the debugging program failed.")
+        traceback.print_exc()
+    with proc_requests_lock:
+        for request in proc_requests.values():
+            if request.waiter: request.waiter.set()
+    proc_events.put(("closed", None))
+proc_reader_thread = threading.Thread(target=_read_replies, name="visualpy-reader", daemon=True)
+proc_reader_thread.start()
+
+def format_payload(payload: Any) -> str:
+    if type(payload) == str: return payload
+    return pprint.pformat(payload)
+
+def target_running() -> bool:
+    with proc_requests_lock:
+        return any(request.resume for request in proc_requests.values())
+
+def refresh_state():
+    with proc_requests_lock:
+        requests = list(proc_requests.values())
+    if proc.poll() != None and proc_events.empty():
+        controllbar_state_label.config(text="terminated")
+    elif any(request.resume for request in requests):
+        controllbar_state_label.config(text="target running")
+    elif requests:
+        controllbar_state_label.config(text="waiting")
+    else:
+        controllbar_state_label.config(text="paused")
 
-    empty_count = 0
-    while not (lineinfo := (line := proc.stdout.readline()).replace("[visualpy] ", "").strip()).startswith("lines: "):
-        if log_in_termianl: terminalview_scrolledtext.insert(tk.END, line+"\n")
-        if len(lineinfo) == 0: empty_count += 1
-        if proc.poll() != None:
-            if callback_closed:
-                callback_closed()
-            return
-    lines = int(lineinfo.replace("lines: ", ""))
-    text = "\n".join([proc.stdout.readline().rstrip("\n") for _ in range(lines)])
-    if log_in_termianl: 
-        terminalview_scrolledtext.insert(tk.END, text+"\n")
+def drain_events():
+    closed_callbacks: list[Callable[[], Any]] = []
+    while True:
+        try: kind, data = proc_events.get_nowait()
+        except queue.Empty: break
+        move_end = terminalview_scrolledtext.yview()[1] == 1
+        if kind == "output":
+            with proc_requests_lock:
+                oldest = next(iter(proc_requests.values()), None)
+            if controllbar_log_in_terminal.get() or (oldest != None and oldest.log_in_termianl):
+                terminalview_scrolledtext.insert(tk.END, cast(bytes, data).decode(errors="replace").replace("[visualpy] ", ""))
+        elif kind == "reply":
+            request, message = cast(tuple[Request | None, Message], data)
+            if request == None: continue
+            if request.channel != None and proc_channel_in_flight.get(request.channel) is request:
+                del proc_channel_in_flight[request.channel]
+                if request.channel in proc_channel_waiting:
+                    _send(proc_channel_waiting.pop(request.channel))
+            if request.superseded: continue
+            start = time.perf_counter()
+            if request.log_in_termianl:
+                terminalview_scrolledtext.insert(tk.END, format_payload(message.payload)+"\n", "failure" if message.kind == KIND_FAILURE else "")
+            if message.kind == KIND_FAILURE:
+                if request.callback_failed: request.callback_failed(message.payload)
+            else:
+                request.callback(message.payload)
+            record_latency(request, message, start, time.perf_counter())
+        else:
+            with proc_requests_lock:
+                closed_callbacks = [request.callback_closed for request in [*proc_requests.values(), *proc_channel_waiting.values()] if request.callback_closed]
+                proc_requests.clear()
+                proc_channel_in_flight.clear()
+                proc_channel_waiting.clear()
         if move_end: terminalview_scrolledtext.yview_moveto(1)
-    callback(text)
-
-communicate = thread(_communicate)
+    for callback_closed in dict.fromkeys(closed_callbacks):
+        callback_closed()
+    refresh_state()
+    root.after(10, drain_events)
+root.after(10, drain_events)
+
+def _send(request: Request) -> bool:
+    assert type(proc.stdin) == BufferedWriter
+    if request.channel != None:
+        proc_channel_in_flight[request.channel] = request
+    with proc_requests_lock:
+        if proc.poll() != None: return False
+        request.id = next(proc_request_ids)
+        proc_requests[request.id] = request
+        request.sent = time.perf_counter()
+        try:
+            proc.stdin.write(f"@{request.id} {request.command}\n".encode())
+            proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            del proc_requests[request.id]
+            return False
+    return True
+
+latency_stats = LatencyStats()
+
+def record_latency(request: Request, message: Message, start: float | None = None, end: float | None = None):
+    roundtrip = message.received - request.sent
+    sample: Sample = {"target": message.target, "serialize": message.serialize, "parse": message.parse, "bytes": message.size}
+    # NOTE the round trip of a command which resumed the program includes the time it ran
+    sample["run" if request.resume else "transfer"] = max(roundtrip - message.target - message.serialize, 0.0)
+    if start == None or end == None:
+        sample["total"] = roundtrip + message.parse
+        latency_stats.record(request.command, sample)
+        return
+    sample["queue"] = start - message.received
+    sample["apply"] = end - start
+    sample["total"] = end - request.sent
+    latency_stats.record(request.command, sample)
+    # NOTE Tk redraws in idle callbacks queued while applying, this one runs after them
+    root.after_idle(lambda: sample.__setitem__("render", time.perf_counter() - end))
+
+def communicate(callback: Callable[[Any], Any], command: str, callback_closed: Callable[[], Any] | None = None, callback_failed: Callable[[str], Any] | None = None, log_in_termianl: bool = False, tag: str = "system", resume: bool = False, channel: str | None = None):
+    if log_in_termianl: terminalview_scrolledtext.insert(tk.END, command+"\n", tag)
+    request = Request(command, callback, callback_closed, callback_failed, log_in_termianl, resume, channel)
+    if channel != None and channel in proc_channel_in_flight:
+        # NOTE keep at most one request per channel in the pipe, only the newest waiting one is sent afterwards.
+        proc_channel_in_flight[channel].superseded = True
+        proc_channel_waiting[channel] = request
+    elif not _send(request):
+        if callback_closed: callback_closed()
+    refresh_state()
+
+SYNC_TIMEOUT = 5.0 # NOTE seconds Tk waits for a synchronous reply, a late reply is dropped
+
+def communicate_sync(command: str, timeout: float = SYNC_TIMEOUT) -> Message | None:
+    request = Request(command, lambda _: None)
+    request.waiter = threading.Event()
+    if not _send(request): return None
+    if not request.waiter.wait(timeout):
+        with proc_requests_lock:
+            proc_requests.pop(request.id, None)
+        raise ValueError(f"No reply to {command.split(' ', 1)[0]} within {timeout:g} seconds.")
+    if request.reply != None: record_latency(request, request.reply)
+    return request.reply
     
-def refresh_frames(text: str):
-    global dataview_tree_frame_id_stack, dataview_tree_variable_id_stack
+def refresh_frames(stack: list[tuple[str, int, str]]):
     for id_ in dataview_tree_frame_will_remove:
-        dataview_tree.delete(id_)
+        delete_row(id_)
     dataview_tree_frame_will_remove.clear()
     
     
-    info = text.splitlines()
-    frames: list[tuple[str, int, str]] = []
-    for line in info:
-        filepath, line, funcname = line.replace("File ", "").replace("\"", "").replace(" line ", "").replace(" in ", "").split(",")
-        frames.append((filepath, int(line), funcname))
-    frames.reverse()
+    frames = list(reversed(stack))
     index = len(dataview_tree_frame_id_stack)
     for i, (frame, tree_element) in enumerate(zip(frames, dataview_tree_frame_id_stack)):
         if frame[0] != tree_element.filename or frame[2] != tree_element.funcname:
             index = i
             for j in range(i, len(dataview_tree_frame_id_stack)):
-                dataview_tree.delete(dataview_tree_frame_id_stack[j].id)
+                for id_ in dataview_model.descendants(dataview_tree_frame_id_stack[j].id): forget_variable(id_)
+                delete_row(dataview_tree_frame_id_stack[j].id)
             del dataview_tree_frame_id_stack[i:]
-            del dataview_tree_variable_id_stack[i:]
-            for (codeWidget_frame, codeWidget_lineno, codeWidget_code, codeWidget_scroll) in codeview_stacks[i:]:
-                codeWidget_frame.pack_forget()
-                codeWidget_frame.destroy()
-            del codeview_stacks[i:]
             break
         if frame[1] != tree_element.line:
             id_ = dataview_tree_frame_id_stack[i].id
             dataview_tree_frame_id_stack[i] = FrameInfo(*frame, id_)
+            dataview_model.replace(dataview_tree_frame_id_stack[i])
             dataview_tree.item(id_, text=f"File {frame[0]}, line {frame[1]}, in {frame[2]}")
     if len(frames) < len(dataview_tree_frame_id_stack):
         for i in range(len(frames), len(dataview_tree_frame_id_stack)):
             dataview_tree.item(dataview_tree_frame_id_stack[i].id, tags="frame_remove")
             dataview_tree_frame_will_remove.append(dataview_tree_frame_id_stack[i].id)
-            codeview_stacks[i][0].destroy()
         del dataview_tree_frame_id_stack[len(frames):]
-        del codeview_stacks[len(frames):]
     
     for i in range(index, len(frames)):
         dataview_tree_frame_id_stack.append(FrameInfo(*frames[i], dataview_tree.insert("", 0, text=f"File {frames[i][0]}, line {frames[i][1]}, in {frames[i][2]}")))
-        
-        code_frame = tk.Frame(codeview_notebook)
-        code_frame.pack(fill=tk.X, side=tk.BOTTOM, expand=True)
-        codeview_notebook.insert("end", code_frame, text=f"frame{len(dataview_tree_frame_id_stack)}")
-        codeview_notebook.update()
-        codeview_notebook.select(len(codeview_stacks))
-        
-        max_line = load_codefile(frames[i][0]).count("\n")+1
-        lineno_area = tk.Text(code_frame, width=max(len(str(max_line)), 3), bg="lightgray")
-        lineno_area.insert(tk.END, "\n".join(map(str, range(1, max_line+1))))
-        lineno_area.config(state=tk.DISABLED)
-        lineno_area.pack(fill=tk.Y, side=tk.LEFT)
-        
-        code_area = tk.Text(code_frame)
-        code_area.tag_config('current', background='#bae1ff', foreground="blue")
-        code_area.insert(tk.END, load_codefile(frames[i][0]))
-        code_area.config(state=tk.DISABLED)
-        code_area.pack(fill=tk.BOTH, side=tk.LEFT)
-        
-        scroll = tk.Scrollbar(code_frame)
-        scroll.pack(fill=tk.Y, side=tk.LEFT)
-        
-        def __ysc(first: float, last: float):
-            lineno_area.yview_moveto(first)
-            scroll.set(first, last)
-        code_area.config(yscrollcommand=__ysc)
-        def __scroll_cmd(*args: tuple[Any]):
-            lineno_area.yview(*args)
-            code_area.yview(*args)
-        scroll.config(command=__scroll_cmd)
-        
-        codeview_stacks.append((code_frame, lineno_area, code_area, scroll))
+        dataview_model.add(dataview_tree_frame_id_stack[-1])
+
+def paint_breakpoints(filename: str):
+    view = codeview_files.get(filename)
+    if view == None: return
+    view.lineno_area.tag_remove("breakpoint", "1.0", tk.END)
+    view.lineno_area.tag_remove("breakpoint_condition", "1.0", tk.END)
+    for (bp_filename, lineno), condition in codeview_breakpoints.items():
+        if bp_filename == filename:
+            view.lineno_area.tag_add("breakpoint" if condition == None else "breakpoint_condition", f"{lineno}.0", f"{lineno+1}.0")
+
+def set_breakpoint(filename: str, lineno: int, condition: str | None):
+    def done(_: Any):
+        codeview_breakpoints[(filename, lineno)] = condition
+        paint_breakpoints(filename)
+    communicate(done, f"bp {shlex.quote(filename)} {lineno}" + ("" if condition == None else " " + shlex.quote(condition)),
+                callback_failed=lambda reason: msgbox.showerror("visualpy", reason),
+                log_in_termianl=controllbar_log_in_terminal.get())
+
+def clear_breakpoint(filename: str, lineno: int):
+    def done(_: Any):
+        codeview_breakpoints.pop((filename, lineno), None)
+        paint_breakpoints(filename)
+    communicate(done, f"nobp {shlex.quote(filename)} {lineno}",
+                callback_failed=lambda reason: msgbox.showerror("visualpy", reason),
+                log_in_termianl=controllbar_log_in_terminal.get())
+
+def toggle_breakpoint(filename: str, lineno: int):
+    if (filename, lineno) in codeview_breakpoints: clear_breakpoint(filename, lineno)
+    else: set_breakpoint(filename, lineno, None)
+
+def ask_breakpoint_condition(filename: str, lineno: int):
+    condition = simpledialog.askstring("Breakpoint", f"Stop at line {lineno} only if (empty for always)", initialvalue=codeview_breakpoints.get((filename, lineno)) or "", parent=root)
+    if condition == None: return
+    set_breakpoint(filename, lineno, condition.strip() or None)
+
+def value_tags(tag: str, truncated: bool) -> tuple[str, ...]:
+    return tuple(t for t in (tag, "truncated" if truncated else "") if t)
 
-def refresh_variables(text: str):
+def forget_variable(id_: str):
+    dataview_tree_variable_token.pop(id_, None)
+    dataview_tree_variable_fetched.pop(id_, None)
+    dataview_tree_variable_fetching.pop(id_, None)
+    dataview_tree_variable_truncated.discard(id_)
+
+def refresh_variables(variables: list[tuple[int, str, int, str, str, str, str, int]]):
     
     move_end = dataview_scroll.get()[1] == 1
     
     for id_, tag in dataview_tree_variable_to_retag:
-        try: dataview_tree.item(id_, tags=tag)
+        try: update_row(id_, tags=value_tags(tag, id_ in dataview_tree_variable_truncated))
         except tk.TclError as tcle: print(tcle)
     dataview_tree_variable_to_retag.clear()
     for to_delete in dataview_tree_variable_will_remove:
-        try: dataview_tree.delete(to_delete)
+        try: delete_row(to_delete)
         except tk.TclError as tcle: print(tcle)
     dataview_tree_variable_will_remove.clear()
     
-    info = text.splitlines()
-    for line_index in range(0, len(info), 2):
-        frame_index = int(info[line_index].split(" ")[0][1:-1])
-        sub_mode = info[line_index+1].index(" ")
-        mode = info[line_index+1][:sub_mode]
-        sub_name = info[line_index+1].index(" ", sub_mode+1)
-        name = info[line_index+1][sub_mode+1:sub_name]
-        sub_type = info[line_index+1].index(" ", sub_name+1)
-        type_ = info[line_index+1][sub_name+1:sub_type]
-        value = info[line_index+1][sub_type+1:]
+    # NOTE removals first, a new frame at the same depth may bring a variable of the same name
+    for frame_index, _, _, _, mode, name, type_, token in variables:
+        if mode != "-": continue
+        vi = dataview_model.variable(frame_index, name)
+        if vi == None: continue
+        update_row(vi.id, tags="var_remove")
+        dataview_tree_variable_will_remove.append(vi.id)
+        dataview_model.forget_variable(vi)
+        forget_variable(vi.id)
+    for frame_index, _, _, _, mode, name, type_, token in variables:
         if mode == "+":
-            id_ = dataview_tree.insert(dataview_tree_frame_id_stack[frame_index].id, "end", text=name, values=(type_, value, ), image=getIconImage(type_), tags="var_add")
-            dataview_tree_variable_id_stack.append(VariableInfo(frame_index, id_, name))
+            id_ = new_row_id()
+            dataview_model.add(VariableInfo(frame_index, id_, name), dataview_tree_frame_id_stack[frame_index].id)
+            insert_row(dataview_tree_frame_id_stack[frame_index].id, id_, text=name, values=(type_, "", ), image=getIconImage(type_), tags="var_add")
+            dataview_tree_variable_to_retag.append((id_, "var_keep"))
+            dataview_tree_variable_token[id_] = token
+        elif mode == "*" or mode == "?": # NOTE "?" is an opaque value which may have changed
+            vi = dataview_model.variable(frame_index, name)
+            if vi == None: continue
+            id_ = vi.id
+            update_row(id_, values=(type_, row_value(id_),), image=getIconImage(type_), tags=value_tags("var_modify" if mode == "*" else "var_keep", id_ in dataview_tree_variable_truncated))
             dataview_tree_variable_to_retag.append((id_, "var_keep"))
-        elif mode == "*":
-            for vi in dataview_tree_variable_id_stack:
-                if vi.name == name:
-                    id_ = vi.id
-                    dataview_tree.item(id_, values=(type_, value,), image=getIconImage(type_), tags="var_modify")
-                    dataview_tree_variable_to_retag.append((id_, "var_keep"))
-                    break
-        elif mode == "-":
-            for vi in dataview_tree_variable_id_stack:
-                if vi.name == name:
-                    id_ = vi.id
-                    dataview_tree.item(id_, tags="var_remove")
-                    dataview_tree_variable_will_remove.append(id_)
-                    dataview_tree_variable_id_stack.remove(vi)
-                    break
-        # dataview_tree_variable_id_stack[frame_index]
+            dataview_tree_variable_token[id_] = token
         
     if move_end: dataview_tree.yview_moveto(1)
+    schedule_fetch_values()
+
+def visible_rows() -> list[str]:
+    rows: list[str] = []
+    y = 1
+    while y < dataview_tree.winfo_height() and (row := dataview_tree.identify_row(y)):
+        rows.append(row)
+        bbox = dataview_tree.bbox(row)
+        y = bbox[1] + bbox[3] + 1 if bbox else y + 20
+    return rows
+
+dataview_fetch_scheduled = False
+def schedule_fetch_values():
+    global dataview_fetch_scheduled
+    if dataview_fetch_scheduled: return
+    dataview_fetch_scheduled = True
+    root.after_idle(fetch_visible_values)
+
+def fetch_visible_values():
+    global dataview_fetch_scheduled
+    dataview_fetch_scheduled = False
+    label_more_rows()
+    rows = visible_rows()
+    for row in rows:
+        if row in dataview_tree_more:
+            show_more_rows(dataview_tree_more[row]) # NOTE schedules again, the next page may be visible as well
+            break
+    targets: dict[tuple[int, str], str] = {}
+    for info in map(idToInfo, rows):
+        if type(info) != VariableInfo: continue
+        token = dataview_tree_variable_token.get(info.id)
+        if token == dataview_tree_variable_fetched.get(info.id) or token == dataview_tree_variable_fetching.get(info.id): continue
+        dataview_tree_variable_fetching[info.id] = cast(int, token)
+        targets[(info.depth, info.name)] = info.id
+    if not targets: return
+    communicate(lambda values: refresh_values(values, targets), " ".join(["values", *[f"{depth} {name}" for depth, name in targets]]))
+
+def refresh_values(values: list[tuple[int, str, str, int, str, bool]], targets: dict[tuple[int, str], str]):
+    for id_ in targets.values():
+        if id_ in dataview_tree_variable_token: # NOTE not to request again values the debugger does not have
+            dataview_tree_variable_fetched[id_] = dataview_tree_variable_fetching.pop(id_, None) # type: ignore
+    for depth, name, type_, token, value, truncated in values:
+        id_ = targets.get((depth, name))
+        if id_ == None or id_ not in dataview_tree_variable_token: continue
+        dataview_tree_variable_fetched[id_] = token
+        if truncated: dataview_tree_variable_truncated.add(id_)
+        else: dataview_tree_variable_truncated.discard(id_)
+        tags = [tag for tag in dataview_tree.item(id_, "tags") if tag != "truncated"]
+        dataview_tree.item(id_, values=(type_, value,), tags=value_tags(tags[0] if tags else "", truncated))
+    schedule_fetch_values() # NOTE rows may have changed while fetching
     
-def refresh_attributes(text: str, targetId: str):
-    lines = text.splitlines()
-    if len(lines) < 2: return
-    if lines[0] != "Success": return
-    line = lines[1]
-    sub_name = line.index(" ")
-    name = line[:sub_name]
-    sub_type = line.index(" ", sub_name+1)
-    type_ = line[sub_name+1:sub_type]
-    sub_default = line.index(" ", sub_type+1)
-    default = line[sub_type+1:sub_default] == "T"
-    value = line[sub_default+1:]
-    
-    dataview_tree.item(targetId, text=name, values=[type_, value], image=getIconImage(type_ + (":disabled" if default else "")), tags="builtin" if default else "")
-
-@lru_cache
-def load_codefile(target: str):
-    print("Reading code at", target)
-    return Path(target).read_text()
-def refresh_codes(text: str):
-    info = text.splitlines()
-    info.reverse()
-    for i, line in enumerate(info):
-        _, line, _, coderange = line.replace("File ", "").replace("\"", "").replace(" line ", "").replace(" in ", "").replace(" at ", "").split(",")
-        codeview_stacks[i][2].tag_remove("current", "1.0", tk.END)
-        lineno, _, end_lineno, _ = map(int, coderange.split("_"))
-        codeview_stacks[i][2].tag_add("current", f"{lineno}.0", f"{end_lineno+1}.0")
-        codeview_stacks[i][1].mark_set("insert", f"{lineno}.0")
-        codeview_stacks[i][1].see("insert")
-        codeview_stacks[i][2].mark_set("insert", f"{lineno}.0")
-        codeview_stacks[i][2].see("insert")
+def refresh_attributes(attribute: tuple[str, str, bool, str, bool], targetId: str):
+    name, type_, default, value, truncated = attribute
     
+    update_row(targetId, values=[type_, value], image=getIconImage(type_ + (":disabled" if default else "")), tags=value_tags("builtin" if default else "", truncated))
+
+def refresh_codes(stack: list[tuple[str, int, str, tuple[int | None, int | None, int | None, int | None]]]):
+    ranges: dict[str, list[tuple[int, int]]] = {} # NOTE innermost frame first
+    for filename, line, _, (lineno, _, end_lineno, _) in stack:
+        if lineno == None: lineno = line
+        if end_lineno == None: end_lineno = lineno
+        ranges.setdefault(filename, []).append((lineno, end_lineno))
+    show_code_views(list(reversed(ranges)))
+    for filename, lines in ranges.items():
+        codeview_files[filename].mark(lines)
+    if stack: codeview_notebook.select(codeview_files[stack[0][0]].frame)
+    
+def paint_allocations(growths: list[tuple[str, int, int, int, int]] | None):
+    by_file: dict[str, list[tuple[int, int, int, int]]] = {}
+    for filename, lineno, grown, blocks, size in growths or []:
+        by_file.setdefault(filename, []).append((lineno, grown, blocks, size))
+    for filename, view in codeview_files.items():
+        view.mark_allocations(by_file.get(filename, []))
+
+profile_lines: list[tuple[str, int, int, float, float, float | None]] = []
+
+def paint_profile():
+    hottest = max((wall for _, _, _, wall, _, _ in profile_lines), default=0.0)
+    by_file: dict[str, list[tuple[int, float]]] = {}
+    for filename, lineno, _, wall, _, _ in profile_lines:
+        by_file.setdefault(filename, []).append((lineno, wall))
+    for filename, view in codeview_files.items():
+        view.mark_profile(by_file.get(filename, []), hottest)
+
 def stop_debug():
     proc.kill()
     controllbar_step_over_button.config(image=iconImage["debug-step-over:disabled"], state=tk.DISABLED)
+    controllbar_continue_button .config(image=iconImage["debug-continue:disabled"], state=tk.DISABLED)
+    controllbar_step_back_button.config(image=iconImage["debug-step-back:disabled"], state=tk.DISABLED)
     controllbar_stop_button     .config(image=iconImage["debug-stop:disabled"], state=tk.DISABLED)
-def step_over_handler(text):
-    refresh_frames(text)
-    communicate(refresh_variables, "frames", log_in_termianl=controllbar_log_in_terminal.get())
-    for attr in dataview_tree_attribute_info_list:
-        func = lambda text, id_=attr.id: refresh_attributes(text, id_)
-        communicate(func, f"detail {attr.depth} {attr.path}", log_in_termianl=controllbar_log_in_terminal.get())
-    communicate(refresh_codes, "seek", log_in_termianl=controllbar_log_in_terminal.get())
-def step_over():
-    communicate(step_over_handler, 
-                "step", "where", 
+def apply_snapshot(snapshot: dict[str, Any], attribute_ids: list[str]):
+    invalidate_completion()
+    refresh_frames([(filename, lineno, function) for filename, lineno, function, _ in snapshot["stack"]])
+    refresh_variables(snapshot["variables"])
+    for id_, attribute in zip(attribute_ids, snapshot["attributes"]):
+        if attribute != None: refresh_attributes(attribute, id_)
+    refresh_codes(snapshot["stack"])
+    paint_allocations(snapshot["allocations"])
+    if profile_enabled.get(): request_profile()
+    if history_view != None:
+        history_source.refresh()
+        history_view.update_range()
+    if memory_panel != None: memory_panel.request()
+def resume(command: str):
+    # NOTE attributes not shown yet are not refreshed
+    attributes = [attr for attr in dataview_model.attributes.values() if attr.id not in dataview_tree_pending_parent]
+    attribute_ids = [attr.id for attr in attributes]
+    communicate(lambda snapshot: apply_snapshot(snapshot, attribute_ids), 
+                " ".join([command, *[f"{attr.depth} {shlex.quote(attr.path)}" for attr in attributes]]), 
                 callback_closed=stop_debug,
-                log_in_termianl=controllbar_log_in_terminal.get())
+                log_in_termianl=controllbar_log_in_terminal.get(),
+                resume=True)
+def step_over():
+    resume("snap")
+def continue_run(): # NOTE the target runs without snapshots until a breakpoint hits
+    resume("csnap")
 controllbar_step_over_button.config(command=step_over)
+controllbar_continue_button .config(command=continue_run)
+
+class HistorySource:
+    # NOTE Steps kept by the history of the debugger. Asked synchronously, only while the target is paused.
+    def __init__(self):
+        self.first = 0
+        self.end = 0
+
+    def refresh(self):
+        if target_running(): return
+        try: message = communicate_sync("history")
+        except ValueError: return
+        if message != None and message.kind != KIND_FAILURE:
+            self.first, self.end = message.payload["first"], message.payload["end"]
+
+    def __len__(self) -> int:
+        return self.end - self.first
+
+    def step(self, step: int) -> tuple[list[TraceFrame], list[Change]]:
+        if target_running(): raise ValueError("The program is running.")
+        message = communicate_sync(f"history {self.first + step}")
+        if message == None: raise ValueError("Debugging program is terminated.")
+        if message.kind == KIND_FAILURE: raise IndexError(message.payload)
+        stack, frames = message.payload["stack"], message.payload["frames"]
+        innermost = len(stack) - 1
+        trace_frames = [
+            TraceFrame(depth, depth - 1, filename, function, lineno, frames[depth] if depth < len(frames) else {})
+            for depth, (filename, lineno, function, _) in zip(range(innermost, -1, -1), stack)
+        ]
+        return trace_frames, [(mode, name, typename, value, truncated) for depth, mode, name, typename, value, truncated in message.payload["changes"] if depth == innermost]
+
+    def close(self):
+        global history_view
+        history_view = None
+
+history_source = HistorySource()
+history_view: TraceView | None = None
+def open_history(step: int = -1): # NOTE step counts from the latest step when negative
+    global history_view
+    history_source.refresh()
+    if history_view != None:
+        history_view.update_range()
+        history_view.jump(step % len(history_source) if len(history_source) else 0)
+        return
+    history_view = TraceView(root, history_source, "history", step)
+def step_back():
+    if history_view != None: history_view.move(-1)
+    else: open_history(-2)
+controllbar_step_back_button.config(command=step_back)
+menubar.add_command(label="History", command=lambda: open_history())
+
+def set_history_limit():
+    def ask(history: dict[str, int]):
+        limit = simpledialog.askinteger("History", f"Memory limit of the history in MB (0 to stop recording)\nUsing {history['bytes'] / 1e6:.1f} MB for {history['end'] - history['first']} steps", initialvalue=history["limit"] >> 20, minvalue=0, parent=root)
+        if limit == None: return
+        communicate(lambda _: None, f"history limit {limit << 20}")
+    communicate(ask, "history")
+menubar.add_command(label="History limit", command=set_history_limit)
+
+MEMORY_REFINE_MS = 100
+MEMORY_HEAT_COLORS = ["#ffffff", "#fff4d6", "#ffe0a3", "#ffc27a", "#ff9a6b", "#ff6b6b"]
+
+class MemoryPanel:
+    """Deep sizes of every variable of every frame, largest first. Objects shared by several variables are counted for
+    the first one in stack order only. Sizes are refined with further mem commands until the debugger has sized all."""
+    def __init__(self):
+        self.window = tk.Toplevel(root)
+        self.window.title("Memory")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.label = tk.Label(self.window, text="", fg="#999999", anchor=tk.W)
+        self.label.pack(fill=tk.X, side=tk.TOP)
+        self.tree = ttk.Treeview(self.window, columns=("frame", "type", "size", "share"))
+        self.tree.heading("#0", text="name")
+        for column in ("frame", "type", "size", "share"): self.tree.heading(column, text=column)
+        for level, color in enumerate(MEMORY_HEAT_COLORS): self.tree.tag_configure(f"heat{level}", background=color)
+        self.tree.tag_configure("estimate", foreground="#999999")
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        self.refining: str | None = None
+        self.request()
+
+    def request(self):
+        self.refining = None
+        if target_running(): return
+        communicate(self.show, "mem", channel="mem")
+
+    def show(self, memory: dict[str, Any]):
+        if not self.window.winfo_exists(): return
+        total = memory["total"]
+        rows = sorted(memory["rows"], key=lambda row: row[3], reverse=True)
+        self.tree.delete(*self.tree.get_children())
+        for depth, name, typename, size, exact in rows:
+            share = size / total if total else 0
+            # NOTE heat by share of the total, a variable owning over half of the memory is the hottest
+            level = min(int(share * 2 * (len(MEMORY_HEAT_COLORS)-1) + 0.999), len(MEMORY_HEAT_COLORS)-1) if size else 0
+            tags = (f"heat{level}",) if exact else (f"heat{level}", "estimate")
+            self.tree.insert("", tk.END, text=name, values=(depth, typename, format_memory(size) + ("" if exact else " ?"), f"{share:.1%}"), tags=tags)
+        pending = memory["pending"]
+        self.label.config(text=f"{format_memory(total)} in {len(rows)} variables" + (f", sizing {pending} more..." if pending else f" (sized in {memory['elapsed']:.2f} s)"))
+        if pending and self.refining == None:
+            self.refining = self.window.after(MEMORY_REFINE_MS, self.request)
+
+    def close(self):
+        global memory_panel
+        if self.refining != None: self.window.after_cancel(self.refining)
+        memory_panel = None
+        self.window.destroy()
+
+memory_panel: MemoryPanel | None = None
+def open_memory():
+    global memory_panel
+    if memory_panel != None:
+        memory_panel.window.deiconify()
+        memory_panel.request()
+        return
+    memory_panel = MemoryPanel()
+menubar.add_command(label="Memory", command=open_memory)
+
+allocations_tracing = tk.BooleanVar(root, False)
+def toggle_allocations():
+    def done(tracing: bool):
+        allocations_tracing.set(tracing)
+        if not tracing: paint_allocations(None)
+    communicate(done, "alloc on" if allocations_tracing.get() else "alloc off")
+menubar.add_checkbutton(label="Allocations", variable=allocations_tracing, command=toggle_allocations)
+communicate(allocations_tracing.set, "alloc")
+
+PROFILE_COLUMNS = {"samples": "samples", "self": "self wall", "total": "total wall", "cpu": "self CPU"}
+
+class ProfilePanel:
+    """Hot lines of the sampling profiler. Columns sort by a click on their heading, double click shows the line."""
+    def __init__(self):
+        self.window = tk.Toplevel(root)
+        self.window.title("Hot lines")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        bar = tk.Frame(self.window)
+        bar.pack(fill=tk.X, side=tk.TOP)
+        tk.Button(bar, text="Clear", relief=tk.FLAT, command=lambda: communicate(show_profile, "prof clear")).pack(side=tk.LEFT)
+        self.label = tk.Label(bar, text="", fg="#999999")
+        self.label.pack(side=tk.LEFT)
+        self.tree = ttk.Treeview(self.window, columns=tuple(PROFILE_COLUMNS))
+        self.tree.heading("#0", text="line", command=lambda: self.sort("#0"))
+        for column, text in PROFILE_COLUMNS.items():
+            self.tree.heading(column, text=text, command=lambda column=column: self.sort(column))
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        self.tree.bind("<Double-Button-1>", lambda _: self.show_line())
+        self.sort_column = "self"
+        self.lines: dict[str, tuple[str, int]] = {}
+
+    def sort(self, column: str):
+        self.sort_column = column
+        self.refresh()
+
+    def refresh(self):
+        rows = list(profile_lines)
+        index = {"#0": None, "samples": 2, "self": 3, "total": 4, "cpu": 5}[self.sort_column]
+        if index == None: rows.sort(key=lambda row: (row[0], row[1]))
+        else: rows.sort(key=lambda row: row[index] or 0, reverse=True) # type: ignore
+        self.tree.delete(*self.tree.get_children())
+        self.lines.clear()
+        for filename, lineno, samples, wall, total, cpu in rows:
+            iid = self.tree.insert("", tk.END, text=f"{Path(filename).name}:{lineno}", values=(samples, f"{wall:.3f} s", f"{total:.3f} s", "-" if cpu == None else f"{cpu:.3f} s"))
+            self.lines[iid] = (filename, lineno)
+        self.label.config(text=f"{sum(row[2] for row in rows)} samples in {len(rows)} lines")
+
+    def show_line(self):
+        selection = self.tree.selection()
+        if not selection or selection[0] not in self.lines: return
+        filename, lineno = self.lines[selection[0]]
+        view = codeview_files.get(filename)
+        if view == None: # NOTE hidden again by the next stop unless the file is on the stack
+            view = codeview_files[filename] = CodeView(filename)
+            paint_breakpoints(filename)
+        else: codeview_notebook.add(view.frame)
+        codeview_notebook.select(view.frame)
+        view.render(lineno, lineno)
+        view.code_area.see(f"{lineno}.0")
+        paint_profile()
+
+    def close(self):
+        global profile_panel
+        profile_panel = None
+        self.window.destroy()
+
+profile_panel: ProfilePanel | None = None
+profile_enabled = tk.BooleanVar(root, False)
+def show_profile(profile: dict[str, Any]):
+    global profile_lines
+    profile_enabled.set(profile["enabled"])
+    profile_lines = profile["lines"]
+    paint_profile()
+    if profile_panel != None: profile_panel.refresh()
+def request_profile(command: str = "prof"):
+    communicate(show_profile, command, channel="prof")
+def toggle_profile():
+    request_profile("prof on" if profile_enabled.get() else "prof off")
+def open_profile():
+    global profile_panel
+    if profile_panel == None: profile_panel = ProfilePanel()
+    else: profile_panel.window.deiconify()
+    request_profile()
+menubar.add_checkbutton(label="Profile", variable=profile_enabled, command=toggle_profile)
+menubar.add_command(label="Hot lines", command=open_profile)
+request_profile()
+
+class LatencyPanel:
+    """Percentiles of the timings of replies by command. Times in milliseconds."""
+    def __init__(self):
+        self.window = tk.Toplevel(root)
+        self.window.title("Latency")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        bar = tk.Frame(self.window)
+        bar.pack(fill=tk.X, side=tk.TOP)
+        tk.Button(bar, text="Refresh", relief=tk.FLAT, command=self.refresh).pack(side=tk.LEFT)
+        tk.Button(bar, text="Clear", relief=tk.FLAT, command=lambda: (latency_stats.clear(), self.refresh())).pack(side=tk.LEFT)
+        tk.Button(bar, text="Export JSON", relief=tk.FLAT, command=self.export).pack(side=tk.LEFT)
+        columns = ("count", *(f"p{percent}" for percent in PERCENTILES), "max")
+        self.tree = ttk.Treeview(self.window, columns=columns)
+        self.tree.heading("#0", text="command / metric")
+        for column in columns: self.tree.heading(column, text=column)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        self.opened: set[str] = set()
+        self.refresh()
+
+    def refresh(self):
+        self.opened = {self.tree.item(iid, "text") for iid in self.tree.get_children() if self.tree.item(iid, "open")}
+        self.tree.delete(*self.tree.get_children())
+        for name, metrics in latency_stats.summary().items():
+            parent = self.tree.insert("", tk.END, text=name, values=(metrics["total"]["count"] if "total" in metrics else "",), open=name in self.opened)
+            for metric in METRICS:
+                if metric not in metrics: continue
+                stats = metrics[metric]
+                text = (lambda value: format_memory(int(value))) if metric == "bytes" else (lambda value: f"{value*1000:.2f}")
+                self.tree.insert(parent, tk.END, text=metric, values=(stats["count"], *(text(stats[f"p{percent}"]) for percent in PERCENTILES), text(stats["max"])))
+
+    def export(self):
+        path = filedialog.asksaveasfilename(parent=self.window, title="Export latency", defaultextension=".json", filetypes=[("JSON", "*.json"), ("All files", "*")])
+        if not path: return
+        try: latency_stats.export(path)
+        except OSError as e: msgbox.showerror("visualpy", str(e))
+
+    def close(self):
+        global latency_panel
+        latency_panel = None
+        self.window.destroy()
+
+latency_panel: LatencyPanel | None = None
+def open_latency():
+    global latency_panel
+    if latency_panel == None: latency_panel = LatencyPanel()
+    else:
+        latency_panel.window.deiconify()
+        latency_panel.refresh()
+menubar.add_command(label="Latency", command=open_latency)
+
 controllbar_stop_button     .config(command=lambda: stop_debug() if msgbox.Message(title="msgbox", message="Are you sure to stop now?", icon=msgbox.WARNING, type=msgbox.OKCANCEL).show() in ("ok", True) else None)
 step_over()
 
 def send_command():
     terminalview_entry.config(bg="#ffffff")
+    invalidate_completion() # NOTE the command may assign names
     move_end = terminalview_scrolledtext.yview()[1] == 1
     
     if terminalview_do_eval_mode.get() == 0:
@@ -509,21 +1310,14 @@ def move_selection_compliment(delta: int):
     terminalview_compliment.see(f"compliment-{terminalview_compliment_select}")
 
 
-def refresh_compliment(text: str = "Success"):
+def refresh_compliment(candidates: list[tuple[str, str]] = []):
     global terminalview_compliment_select
     terminalview_compliment_select = 0
     
     terminalview_compliment.delete(*terminalview_compliment.get_children())
     
-    lines = text.splitlines()
-    if not lines[0].startswith("S"): return
-    lines = lines[1:]
-    
     compliments: list[str] = []
-    for i, line in enumerate(lines):
-        index = line.index(" ")
-        varname = line[:index]
-        typename = line[index+1:]
+    for i, (varname, typename) in enumerate(candidates):
         compliments.append(varname)
         
         terminalview_compliment.insert("", tk.END, f"compliment-{i}", text=varname, image=iconImage["symbol-method"] if typename == "function" else iconImage["symbol-property"] if typename == "property" else iconImage["symbol-class"] if typename == "type" else iconImage["symbol-variable"])
@@ -544,6 +1338,67 @@ def refresh_compliment(text: str = "Success"):
     global terminalview_compliment_list
     terminalview_compliment_list = compliments
 
+# NOTE Candidates are asked once per base expression and stop, with the empty prefix, and filtered here as keys are typed.
+#      Attributes of a type are kept by its type key, so other instances of the type only bring their own __dict__.
+COMPLETION_DEBOUNCE_MS = 150
+COMPLETION_LIMIT = 200
+COMPLETION_TYPES = 64
+@dataclass
+class CompletionTable:
+    step: int
+    names: list[str] # NOTE sorted, searched with bisect
+    typenames: list[str]
+
+    def find(self, prefix: str) -> list[tuple[str, str]]:
+        start = bisect.bisect_left(self.names, prefix)
+        end = start
+        while end < len(self.names) and end - start < COMPLETION_LIMIT and self.names[end].startswith(prefix): end += 1
+        return list(zip(self.names[start:end], self.typenames[start:end]))
+completion_step = 0 # NOTE changes whenever the program may have changed names
+completion_tables: dict[str, CompletionTable] = {} # NOTE base expression ("" for names) ->
+completion_types: dict[str, list[tuple[str, str]]] = {} # NOTE type key -> attributes of the type
+completion_base_types: dict[str, str] = {} # NOTE base expression -> type key of its last value
+completion_after: str | None = None
+
+def invalidate_completion():
+    global completion_step
+    completion_step += 1
+
+def split_completion(text: str) -> tuple[str, str]:
+    base, dot, prefix = text.rpartition(".")
+    return (base, prefix) if dot else ("", text)
+
+def update_completion(text: str):
+    global completion_after
+    base, prefix = split_completion(text)
+    table = completion_tables.get(base)
+    refresh_compliment(table.find(prefix) if table != None else [])
+    if table != None and table.step == completion_step: return
+    if completion_after != None: root.after_cancel(completion_after)
+    completion_after = root.after(COMPLETION_DEBOUNCE_MS, lambda: request_completion(base))
+
+def request_completion(base: str):
+    global completion_after
+    completion_after = None
+    step = completion_step
+    def done(reply: dict[str, Any]):
+        names = reply["names"]
+        if reply["type"] != None:
+            if names == None: names = completion_types.get(reply["type"], [])
+            else:
+                completion_types.pop(reply["type"], None)
+                completion_types[reply["type"]] = names
+                while len(completion_types) > COMPLETION_TYPES: del completion_types[next(iter(completion_types))]
+            completion_base_types[base] = reply["type"]
+        if reply["instance"]: names = sorted({**dict(names), **dict(reply["instance"])}.items())
+        completion_tables.pop(base, None)
+        completion_tables[base] = CompletionTable(step, [name for name, _ in names], [typename for _, typename in names])
+        while len(completion_tables) > COMPLETION_TYPES: del completion_tables[next(iter(completion_tables))]
+        if split_completion(terminalview_entry.get())[0] == base: update_completion(terminalview_entry.get())
+    known = completion_base_types.get(base)
+    command = "complete" if not base else f"complete {shlex.quote(base)}" + ("" if known == None or known not in completion_types else f" {shlex.quote(known)}")
+    communicate(done, command, callback_failed=lambda _: completion_tables.pop(base, None), channel="comp")
+
 def on_terminalview_entry_write(event: "tk.Event[tk.Entry]"):
     
     if event.char and event.char in "ABCDEFGHIJKLNMOPQRSTUVWXYZ" + "ABCDEFGHIJKLNMOPQRSTUVWXYZ".lower() + "1234567890!@#$%^&*()" + "-_=+[{]}\\|;:\'\",<.>`~":
@@ -560,13 +1415,13 @@ def on_terminalview_entry_write(event: "tk.Event[tk.Entry]"):
         terminalview_entry.insert(tk.END, text)
         
         
-    communicate(refresh_compliment, f"comp {terminalview_entry.get() + event.char}")
+    update_completion(terminalview_entry.get() + event.char)
     
     
 def on_terminalview_entry_delete(event: "tk.Event[tk.Entry]"):
     terminalview_entry.config(bg="#ffffff")
     if terminalview_entry.get():
-        communicate(refresh_compliment, f"comp {terminalview_entry.get()[:-1]}")
+        update_completion(terminalview_entry.get()[:-1])
 for b in ("BackSpace", "Delete", "space"):
     terminalview_entry.bind(f"<{b}>", on_terminalview_entry_delete)
 terminalview_entry.bind("<Key>", on_terminalview_entry_write)
@@ -574,33 +1429,35 @@ terminalview_entry.bind("<Up>", lambda _: move_selection_compliment(-1))
 terminalview_entry.bind("<Down>", lambda _: move_selection_compliment(+1))
 
 
-def create_attribute(depth: int, parentPath: str, parentId: str, text: str):
-    if not text.startswith("S"):
-        return
-    lines = text.splitlines()[1:]
-    for line in lines:
-        sub_name = line.index(" ")
-        name = line[:sub_name]
-        sub_type = line.index(" ", sub_name+1)
-        type_ = line[sub_name+1:sub_type]
-        sub_default = line.index(" ", sub_type+1)
-        default = line[sub_type+1:sub_default] == "T"
-        value = line[sub_default+1:]
-        
-        dataview_tree.item(parentId, open=True)
-        dataview_tree_attribute_info_list.append(AttributeInfo(
-            depth,
-            parentId,
-            parentPath+"."+name,
-            dataview_tree.insert(parentId, tk.END, text=name, image=getIconImage(type_ + (":disabled" if default else "")), values=[type_, value], tags="builtin" if default else ""),
-            name
-        ))
+def request_children(depth: int, parentPath: str, parentId: str, offset: int):
+    def failed(reason: str):
+        if parentId in dataview_tree_pending: dataview_tree.item(dataview_tree_pending[parentId].more, text=reason)
+        else: msgbox.showerror("visualpy", reason)
+    communicate(lambda page: create_attribute(depth, parentPath, parentId, page),
+                f"children {depth} {shlex.quote(parentPath)} {offset} {DATAVIEW_PAGE_ROWS}",
+                callback_failed=failed,
+                log_in_termianl=controllbar_log_in_terminal.get())
+
+def create_attribute(depth: int, parentPath: str, parentId: str, page: dict[str, Any]):
+    # NOTE the item may have been closed or removed while the page was on the way
+    if parentId not in dataview_model.infos or (page["offset"] and parentId not in dataview_tree_pending): return
+    dataview_tree.item(parentId, open=True)
+    for step, name, type_, default, value, truncated in page["children"]:
+        id_ = new_row_id()
+        dataview_model.add(AttributeInfo(depth, parentId, parentPath+step, id_, name), parentId)
+        insert_row(parentId, id_, text=name, image=getIconImage(type_ + (":disabled" if default else "")), values=[type_, value], tags=value_tags("builtin" if default else "", truncated))
+    loaded = page["offset"] + len(page["children"])
+    expect_rows(parentId, page["total"] - loaded, lambda: request_children(depth, parentPath, parentId, loaded))
+    if page["offset"]: show_more_rows(parentId)
+    schedule_fetch_values()
 
 def on_dataview_detail(event: "tk.Event[ttk.Treeview]"):
     
     target, *_ = dataview_tree.selection()
-    for fstack in dataview_tree_frame_id_stack:
-        if fstack.id == target: return
+    if target in dataview_tree_more:
+        show_more_rows(dataview_tree_more[target])
+        return
+    if type(idToInfo(target)) == FrameInfo: return
     
     target_depth = -1
     target_path = ""
@@ -620,35 +1477,17 @@ def on_dataview_detail(event: "tk.Event[ttk.Treeview]"):
         msgbox.showwarning("tk", "Failed to find target: "+target)
         return
     
-    for attr_info in dataview_tree_attribute_info_list: # If already updated
-        if attr_info.parentId == target:
-            return
-    communicate(lambda text: create_attribute(target_depth, target_path, target, text), f"detailall {target_depth} {target_path}", log_in_termianl=controllbar_log_in_terminal.get())
+    if dataview_model.children.get(target): return # If already updated
+    request_children(target_depth, target_path, target, 0)
 dataview_tree.bind("<Double-1>", on_dataview_detail)
 def on_dataview_close(event: "tk.Event[ttk.Treeview]"):
-    global dataview_tree_attribute_info_list
     target, *_ = dataview_tree.selection()
-    is_attr_holder = False
-    if type(idToInfo(target)) == VariableInfo:
-        is_attr_holder = True
-    for attr_info in dataview_tree_attribute_info_list:
-        if attr_info.id == target: is_attr_holder = True
-        if is_attr_holder: break
-    if not is_attr_holder: return
-    
+    if type(idToInfo(target)) not in (VariableInfo, AttributeInfo): return
     
-    
-    deleter_tree_elements = [target]
-    while True:
-        recently_change = False
-        for attr_info in dataview_tree_attribute_info_list:
-            if attr_info.id not in deleter_tree_elements and attr_info.parentId in deleter_tree_elements:
-                deleter_tree_elements.append(attr_info.id)
-                recently_change = True
-        if not recently_change: break
-    deleter_tree_elements.remove(target)
-    dataview_tree.delete(*deleter_tree_elements)
-    dataview_tree_attribute_info_list = [e for e in dataview_tree_attribute_info_list if e.id not in deleter_tree_elements]
+    # NOTE deleting the direct children takes their subtrees with them in the tree
+    children = [id_ for id_ in dataview_model.children.get(target, ()) if id_ not in dataview_tree_pending_parent]
+    drop_pending([target, *dataview_model.remove(target, keep_self=True)])
+    if children: dataview_tree.delete(*children)
         
             
 dataview_tree.bind("<<TreeviewClose>>", on_dataview_close)
@@ -662,23 +1501,96 @@ def on_dataview_right_click(event: "tk.Event[ttk.Treeview]"):
     item = dataview_tree.identify_row(event.y)
     if item:
         dataview_tree_context_target.set(item)
-    if item and not any([frame.id == item for frame in dataview_tree_frame_id_stack]):
+    if item and type(idToInfo(item)) in (VariableInfo, AttributeInfo):
         dataview_tree.selection_set(item)
         menu_treeview.post(event.x_root, event.y_root)
     else:
         menu_treeview.unpost()
 dataview_tree.bind("<Button-3>", on_dataview_right_click)
+
+def show_full_value(depth: int, path: str, value: str):
+    window = tk.Toplevel(root)
+    window.title(f"{path} at frame #{depth}")
+    scrollview = sttk.ScrolledText(window)
+    scrollview.insert(tk.END, value)
+    scrollview.config(state=tk.DISABLED)
+    scrollview.pack(fill=tk.BOTH, expand=True)
+
+def request_full_value():
+    info = idToInfo(dataview_tree_context_target.get())
+    if type(info) not in (VariableInfo, AttributeInfo): return
+    assert type(info) == VariableInfo or type(info) == AttributeInfo
+    communicate(lambda value: show_full_value(info.depth, info.path, value), f"full {info.depth} {shlex.quote(info.path)}", callback_failed=lambda reason: msgbox.showerror("visualpy", reason))
+menu_treeview.add_command(label="Show full value", command=request_full_value)
+
+def request_statistics():
+    info = idToInfo(dataview_tree_context_target.get())
+    if type(info) not in (VariableInfo, AttributeInfo): return
+    assert type(info) == VariableInfo or type(info) == AttributeInfo
+    def show(stats: dict[str, Any]):
+        show_full_value(info.depth, info.path, "\n".join(f"{key}: {value}" for key, value in stats.items()))
+    communicate(show, f"stats {info.depth} {shlex.quote(info.path)}", callback_failed=lambda reason: msgbox.showerror("visualpy", reason))
+menu_treeview.add_command(label="Show statistics", command=request_statistics)
+
+def set_value_budget():
+    def ask(budget: tuple[int, int]):
+        chars = simpledialog.askinteger("Value budget", "Characters per value", initialvalue=budget[0], minvalue=8, parent=root)
+        if chars == None: return
+        depth = simpledialog.askinteger("Value budget", "Container depth per value", initialvalue=budget[1], minvalue=0, parent=root)
+        if depth == None: return
+        communicate(lambda _: None, f"budget {chars} {depth}")
+    communicate(ask, "budget")
+menubar.add_command(label="Value budget", command=set_value_budget)
+
+def open_trace():
+    path = filedialog.askopenfilename(parent=root, title="Open trace", filetypes=[("visualpy trace", "*.vpt"), ("All files", "*")])
+    if not path: return
+    try: TraceView(root, TraceReader(path), f"trace {path}")
+    except (OSError, ValueError) as e: msgbox.showerror("visualpy", str(e))
+menubar.add_command(label="Open trace", command=open_trace)
 dataview_tree.bind("<<TreeviewSelect>>", lambda e: print(3))
 
 
 
 def requestData(depth: int, target: str, serialize: bool = True) -> object:
-    var: list[str] = []
-    _communicate(var.append, "req" + ("S" if serialize else "") + " " + str(depth) + " " + target)
-    lines = var[0].splitlines()
-    if lines[0][0] == "F":
-        raise ValueError(lines[1])
-    return pickle.loads(eval(lines[1]))
+    if target_running(): raise ValueError("The program is running.")
+    message = communicate_sync("req" + ("S" if serialize else "") + " " + str(depth) + " " + shlex.quote(target))
+    if message == None:
+        raise ValueError("Debugging program is terminated.")
+    if message.kind == KIND_FAILURE:
+        raise ValueError(message.payload)
+    if type(message.payload) != dict:
+        return pickle.loads(message.payload)
+    
+    segment = attach_segment(message.payload["segment"])
+    communicate(lambda _: None, f"release {message.payload['segment']}") # NOTE the segment stays mapped here after it is unlinked
+    views: list[memoryview] = []
+    offset = 0
+    for size in message.payload["sizes"]:
+        views.append(segment.buf[offset:offset+size])
+        offset += size
+    data = pickle.loads(views[0], buffers=views[1:])
+    views.clear()
+    shared_segments.append(segment)
+    close_segments()
+    return data
+
+# NOTE Segments of reqS replies. Objects unpickled from them use their memory without a copy,
+#      a segment is closed once nothing uses it anymore.
+shared_segments: list[SharedMemory] = []
+
+def attach_segment(name: str) -> SharedMemory:
+    try: return SharedMemory(name, track=False) # type: ignore
+    except TypeError: # NOTE before 3.13, attaching registers the segment to be unlinked again at exit
+        segment = SharedMemory(name)
+        if os.name == "posix": resource_tracker.unregister(segment._name, "shared_memory") # type: ignore
+        return segment
+
+def close_segments():
+    for segment in list(shared_segments):
+        try: segment.close()
+        except BufferError: continue
+        shared_segments.remove(segment)
 
 ####################################################################################################
 @dataclass
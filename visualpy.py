@@ -1,35 +1,256 @@
+import ast
+import atexit
+import builtins
 import dis
+from collections.abc import Mapping, Sequence, Set
+from functools import lru_cache
 import inspect
+import linecache
+import os
+from itertools import count, islice
 import pdb
+import reprlib
+import shlex
+import subprocess
 import sys
 import pprint
+import time
+import tokenize
+import weakref
 import platform
 from pathlib import Path
 from types import FrameType
-from typing import Any, cast
+from typing import Any, Callable, cast
 
 from pympler import asizeof
 import pickle
 import ctypes
 from multiprocessing.shared_memory import SharedMemory
 
+from protocol import KIND_FAILURE, KIND_REPLY, encode
+from allocations import AllocationTracker
+from history import HISTORY_BYTES, History
+from memory import MEMORY_BUDGET, MemoryMeter
+from locations import Positions, frame_location, frame_positions
+from profiler import LineProfiler
+from tracking import fingerprint, is_buffer
+import recorder
+import tracking
+
 default_types = [type(None.__new__), type(None.__repr__)]
 here = Path(__file__).parent.absolute()
+# NOTE modules of the debugger itself, not of the program next to it. Left out of allocation growth and profiles.
+DEBUGGER_FILES = (__file__, *(sys.modules[name].__file__ for name in ("allocations", "history", "locations", "memory", "profiler", "protocol", "recorder", "tracking")))
 
 def repr_data(target: object):
     return repr(target).replace("\n", "")
+
+REPR_CHARS = 256
+REPR_DEPTH = 3
+NUMERIC_FORMATS = set("bBhHiIlLqQnNefd?")
+STATS_CHUNK_BYTES = 1 << 20 # NOTE buffers are summarized this many bytes at a time without numpy, as Python lists
+
+def format_size(size: int) -> str:
+    for unit in ("bytes", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB": break
+        size /= 1024 # type: ignore
+    return f"{size} bytes" if unit == "bytes" else f"{size:.1f} {unit}"
+
+def buffer_shape(target: Any) -> tuple[tuple[int, ...], str, int]:
+    """shape, dtype (or struct format) and nbytes of a numpy array or an object with the buffer protocol."""
+    numpy = sys.modules.get("numpy")
+    if numpy != None and isinstance(target, numpy.ndarray):
+        return target.shape, str(target.dtype), target.nbytes
+    with memoryview(target) as view:
+        return view.shape or (), view.format, view.nbytes
+
+def buffer_stats(target: Any) -> dict[str, Any]:
+    """count, min, max, mean and NaN count of a numeric buffer. Vectorized with numpy if the program has loaded it."""
+    shape, dtype, nbytes = buffer_shape(target)
+    stats: dict[str, Any] = {"shape": shape, "dtype": dtype, "nbytes": nbytes}
+    numpy = sys.modules.get("numpy")
+    if numpy != None:
+        array = numpy.asarray(target)
+        if array.dtype.kind not in "biufc": raise TypeError(f"Statistics of dtype {array.dtype} are not supported.")
+        stats["count"] = int(array.size)
+        nan = numpy.isnan(array) if array.dtype.kind in "fc" else None
+        stats["nan"] = int(nan.sum()) if nan is not None else 0
+        valid = array[~nan] if nan is not None and stats["nan"] else array
+        if valid.size:
+            if array.dtype.kind != "c": stats["min"], stats["max"] = valid.min().item(), valid.max().item()
+            stats["mean"] = valid.mean().item()
+        return stats
+    count = nan = 0
+    total = 0.0
+    with memoryview(target) as view:
+        if view.format not in NUMERIC_FORMATS: raise TypeError(f"Statistics of format {view.format} are not supported.")
+        # NOTE a strided view of more than one dimension can not be sliced, it is copied once
+        flat = view.cast("B").cast(view.format) if view.c_contiguous else view if view.ndim <= 1 else memoryview(view.tobytes()).cast(view.format)
+        step = max(STATS_CHUNK_BYTES // view.itemsize, 1)
+        for start in range(0, len(flat), step):
+            values = flat[start:start+step].tolist()
+            valid = [value for value in values if value == value]
+            count += len(values)
+            nan += len(values) - len(valid)
+            if not valid: continue
+            low, high = min(valid), max(valid)
+            stats["min"] = min(stats.get("min", low), low)
+            stats["max"] = max(stats.get("max", high), high)
+            total += sum(valid)
+    stats["count"] = count
+    stats["nan"] = nan
+    if count > nan: stats["mean"] = total / (count - nan)
+    return stats
+
+class BoundedRepr(reprlib.Repr):
+    # NOTE Stops at the budget like reprlib, and remembers whether anything was cut off.
+    def __init__(self, chars: int = REPR_CHARS, depth: int = REPR_DEPTH):
+        super().__init__()
+        self.chars = chars
+        self.maxlevel = depth
+        self.maxstring = self.maxlong = self.maxother = chars
+        self.maxtuple = self.maxlist = self.maxarray = self.maxset = self.maxfrozenset = self.maxdeque = self.maxdict = 16
+        self.truncated = False
+
+    def render(self, target: object) -> tuple[str, bool]:
+        self.truncated = False
+        text = self.repr(target).replace("\n", "")
+        if len(text) > self.chars:
+            text = text[:max(self.chars-len(self.fillvalue), 0)] + self.fillvalue
+            self.truncated = True
+        return text, self.truncated
+
+    def _repr_iterable(self, x, level, left, right, maxiter, trail=''):
+        if len(x) > maxiter or (level <= 0 and len(x)): self.truncated = True
+        return super()._repr_iterable(x, level, left, right, maxiter, trail)
+
+    # NOTE reprlib sorts whole sets and dicts first, which costs the full size of the container.
+    def repr_set(self, x, level):
+        if not x: return "set()"
+        return self._repr_iterable(x, level, "{", "}", self.maxset)
+
+    def repr_frozenset(self, x, level):
+        if not x: return "frozenset()"
+        return self._repr_iterable(x, level, "frozenset({", "})", self.maxfrozenset)
+
+    def repr_dict(self, x, level):
+        if not x: return "{}"
+        if level <= 0:
+            self.truncated = True
+            return "{" + self.fillvalue + "}"
+        pieces = [f"{self.repr1(key, level-1)}: {self.repr1(value, level-1)}" for key, value in islice(x.items(), self.maxdict)]
+        if len(x) > self.maxdict:
+            pieces.append(self.fillvalue)
+            self.truncated = True
+        return "{" + ", ".join(pieces) + "}"
+
+    def repr_str(self, x, level):
+        if len(x) > self.maxstring or len(builtins.repr(x)) > self.maxstring: self.truncated = True
+        return super().repr_str(x, level)
+
+    def repr_int(self, x, level):
+        try: s = super().repr_int(x, level)
+        except ValueError: # NOTE exceeds the limit of int string conversion
+            self.truncated = True
+            return f"<int of {x.bit_length()} bits>"
+        if self.fillvalue in s: self.truncated = True
+        return s
+
+    # NOTE Buffers larger than the budget show their shape instead of their contents.
+    def summary(self, x) -> str | None:
+        try: shape, dtype, nbytes = buffer_shape(x)
+        except (TypeError, ValueError, BufferError): return None
+        if nbytes <= self.chars: return None
+        self.truncated = True
+        return f"<{type(x).__name__} {shape} {dtype}, {format_size(nbytes)}>"
+
+    def repr_ndarray(self, x, level):
+        return self.summary(x) or self.repr_instance(x, level)
+    repr_memmap = repr_memoryview = repr_bytearray = repr_bytes = repr_ndarray
+
+    def repr_array(self, x, level):
+        return self.summary(x) or super().repr_array(x, level)
+
+    def repr_instance(self, x, level):
+        try: s = builtins.repr(x)
+        except Exception: return f"<{type(x).__name__} instance at {id(x):#x}>"
+        if len(s) > self.maxother:
+            self.truncated = True
+            i = max(0, (self.maxother-3)//2)
+            j = max(0, self.maxother-3-i)
+            s = s[:i] + self.fillvalue + s[len(s)-j:]
+        return s
     
+# NOTE A path is a variable name followed by steps: .attr, [literal] for an index or key written as a Python literal,
+#      and [#n] for the n-th item in iteration order, for set members and keys which can not be written as a literal.
+STEP_ATTR, STEP_ITEM, STEP_NTH = range(3)
+PathStep = tuple[int, Any]
+LITERAL_KEY_TYPES = {str, int, bytes, bool, type(None)}
+LITERAL_KEY_CHARS = 256
+
+@lru_cache(maxsize=1024)
+def parse_path(path: str) -> tuple[str, tuple[PathStep, ...]]:
+    end = len(path)
+    i = 0
+    while i < end and path[i] not in ".[": i += 1
+    name = path[:i]
+    steps: list[PathStep] = []
+    try:
+        while i < end:
+            if path[i] == ".":
+                j = i + 1
+                while j < end and path[j] not in ".[": j += 1
+                steps.append((STEP_ATTR, path[i+1:j]))
+            elif path.startswith("[#", i):
+                j = path.index("]", i)
+                steps.append((STEP_NTH, int(path[i+2:j])))
+                j += 1
+            else: # NOTE the literal itself may contain "]", the first one which closes a valid literal ends the step
+                j = path.index("]", i)
+                while True:
+                    try:
+                        steps.append((STEP_ITEM, ast.literal_eval(path[i+1:j])))
+                        break
+                    except (ValueError, SyntaxError):
+                        j = path.index("]", j+1)
+                j += 1
+            i = j
+    except ValueError:
+        raise LookupError(f"Invalid path: {path}") from None
+    return name, tuple(steps)
+
+def container_kind(target: object) -> str:
+    if isinstance(target, (str, bytes, bytearray, memoryview)): return "attributes"
+    if isinstance(target, Mapping): return "mapping"
+    if isinstance(target, Sequence): return "sequence"
+    if isinstance(target, Set): return "set"
+    return "attributes"
+
+def child_object(target: object, step: PathStep) -> object:
+    kind, key = step
+    if kind == STEP_ATTR:
+        return object.__getattribute__(target, key)
+    if kind == STEP_NTH and not isinstance(target, Sequence):
+        for item in islice(iter(target), key, None): # type: ignore
+            return target[item] if isinstance(target, Mapping) else item
+        raise IndexError(f"No item #{key}")
+    if isinstance(target, Mapping) and key not in target: # NOTE not to add keys to a defaultdict
+        raise KeyError(key)
+    return target[key] # type: ignore
+
 def suppress_warning(function):
-    def inner(*args, **kwargs):
-        try: return function(*args, **kwargs)
+    def inner(self: "Debug", *args, **kwargs):
+        try: return function(self, *args, **kwargs)
         except Exception as e:
-            print("lines: 1")
-            print(e)
+            self.reply(str(e), KIND_FAILURE)
     return inner
     
 
 KNOWN_UNITS = {"KB", "MB", "BYTES"}
 
+# NOTE reqS replies larger than this go through a shared memory segment instead of the pipe
+SHARED_MEMORY_BYTES = 1 << 20
+
 
 from dataclasses import dataclass, field
 
@@ -45,8 +266,32 @@ class Debug(pdb.Pdb):
         super(Debug, self).__init__(*args, **kwargs)
         self.prompt = "[visualpy] "
         self.data: list[dict[VariableInfo, Any]] = [] #type: ignore
+        # NOTE (fingerprint, change token) of each value in data. The token changes only when the value changed.
+        self.states: list[dict[VariableInfo, tuple[int | bytes | None, int]]] = []
+        self.tokens = count(1)
+        # NOTE (frame, f_lasti) of each depth at the last scan, to skip frames which have not executed since.
+        self.frame_marks: list[tuple[FrameType, int]] = []
         
         self.lastframe = None
+        self.repr = BoundedRepr()
+        self.request_id = 0
+        self.replied = False
+        self.command_started = time.perf_counter() # NOTE reported as the target work of the reply
+        # NOTE (request id, subscriptions) of the command which resumed the target. Replied when the next stop is reached.
+        self.resume_request: tuple[int, list[tuple[int, str]] | None] | None = None
+        # NOTE rendered changes of every step, so the visualizer can go back without running the program again.
+        #      Off until history limit or debug(..., history=True), it renders every changed value at every scan.
+        self.history = History(limit=0)
+        # NOTE type -> (type key, attributes of the type) for completion, shared by every instance of the type.
+        self.completion_types: weakref.WeakKeyDictionary[type, tuple[str, list[tuple[str, str]]]] = weakref.WeakKeyDictionary()
+        # NOTE shared memory segments of reqS replies, until the visualizer has attached them and sends release.
+        self.segments: dict[str, SharedMemory] = {}
+        # NOTE deep sizes of every value in data for the memory panel, refined over several mem commands
+        self.memory = MemoryMeter()
+        # NOTE allocations of the debugger and of the modules it runs on are left out of the growth between stops
+        self.allocations = AllocationTracker((*DEBUGGER_FILES, str(Path(asizeof.__file__).parent) + os.sep, pdb.__file__, pdb.bdb.__file__, pdb.cmd.__file__, reprlib.__file__, linecache.__file__, tokenize.__file__, ast.__file__, shlex.__file__, pprint.__file__, dis.__file__, inspect.__file__, weakref.__file__)) # type: ignore
+        # NOTE frames of bdb are tracing overhead of the program, frames of pdb and this file mean the program is paused
+        self.profiler = LineProfiler((*DEBUGGER_FILES, pdb.bdb.__file__), (pdb.__file__, pdb.cmd.__file__, __file__)) # type: ignore
         
 
     def format_bytes(self, value: int, unit: str) -> str:
@@ -64,138 +309,240 @@ class Debug(pdb.Pdb):
 
         return f"{converted:.2f} {base_unit}"
 
+    def reply(self, payload: Any, kind: int = KIND_REPLY, request_id: int | None = None):
+        self.stdout.flush() # NOTE keep outputs of the program before the reply
+        out = self.stdout.buffer # type: ignore
+        out.write(encode(payload, kind, self.request_id if request_id == None else request_id, time.perf_counter() - self.command_started))
+        out.flush()
+        self.replied = True
+
+    def precmd(self, line: str) -> str:
+        self.command_started = time.perf_counter()
+        self.request_id = 0
+        self.replied = False
+        if line.startswith("@"):
+            request_id, _, line = line.partition(" ")
+            self.request_id = int(request_id[1:])
+        return super().precmd(line)
+
+    def postcmd(self, stop: bool | None, line: str) -> bool | None:
+        if stop:
+            self.profiler.resume()
+        if self.request_id and not self.replied: # NOTE every tagged command gets exactly one reply
+            if stop:
+                self.resume_request = (self.request_id, None)
+            else:
+                self.reply(None)
+        return stop
+
+    def find_object(self, depth: int, target: str) -> object:
+        name, steps = parse_path(target)
+        for f, v in self.data[depth].items():
+            if f.name == name:
+                target_object = v
+                break
+        else:
+            raise LookupError("Can not find object.")
+
+        for step in steps:
+            target_object = child_object(target_object, step)
+        return target_object
+
+    def path_name(self, target: str) -> str:
+        name, steps = parse_path(target)
+        if not steps: return name
+        kind, key = steps[-1]
+        if kind == STEP_ATTR: return key
+        if kind == STEP_NTH: return f"#{key}"
+        return self.repr.render(key)[0]
+
+    def describe(self, name: str, target_object: object) -> tuple[str, str, bool, str, bool]:
+        return (name, type(target_object).__name__, type(target_object) in default_types, *self.repr.render(target_object))
+
+    def stack_positions(self) -> list[tuple[str, int, str, Positions]]:
+        frame = self.curframe
+        stack: list[tuple[str, int, str, Positions]] = []
+        while frame != None:
+            stack.append(frame_positions(frame))
+            frame = frame.f_back
+        return stack
     
     def do_where(self, arg: str):
         frame = self.curframe
-        text = ""
+        stack: list[tuple[str, int, str]] = []
         while frame != None:
-            loc = inspect.getframeinfo(cast(FrameType, frame))
-        
-            text += f'File "{loc.filename}", line {loc.lineno}, in {loc.function}\n'
-            frame = cast(FrameType, frame).f_back
-        self.message("lines: "+str(text.count("\n"))) # NOTE don't add 1 line cause each lines are added '\n'
-        self.message(text.strip())
+            stack.append(frame_location(frame))
+            frame = frame.f_back
+        self.reply(stack)
     def do_seek(self, arg: str):
-        frame = self.curframe
-        text = ""
-        while frame != None:
-            loc = inspect.getframeinfo(cast(FrameType, frame))
-            
-            positions = cast(dis.Positions, loc.positions)
-        
-            text += f'File "{loc.filename}", line {loc.lineno}, in {loc.function}, at {positions.lineno}_{positions.col_offset}_{positions.end_lineno}_{positions.end_col_offset}\n'
-            frame = cast(FrameType, frame).f_back
-        self.message("lines: "+str(text.count("\n"))) # NOTE don't add 1 line cause each lines are added '\n'
-        self.message(text.strip())
+        self.reply(self.stack_positions())
     def do_ev(self, arg):
         try:
             val = self._getval(arg)
         except Exception as e:
-            text = ""
-            text += str(e)
-            self.message("lines: "+str(text.count("\n")+1))
-            self.message(text.strip())
+            self.reply(str(e), KIND_FAILURE)
             return  # _getval() has displayed the error
         try:
-            text = repr_data(val)
-            self.message("lines: "+str(text.count("\n")+1))
-            self.message(text.strip())
-        except:
+            self.reply(repr_data(val))
+        except Exception as e:
             self._error_exc() # type: ignore
+            self.reply(str(e), KIND_FAILURE)
     @suppress_warning
     def do_detailall(self, arg):
-        depth_str, target = arg.split()
-        depth = int(depth_str)
-        target_path = target.split(".")
+        depth_str, target = shlex.split(arg)
+        target_object = self.find_object(int(depth_str), target)
         
-        target_object: object = None
-        found_init_object = False
-        
-        for f, v in self.data[depth].items():
-            if f.name == target_path[0]:
-                target_object = v
-                found_init_object = True
-                break
-        if not found_init_object:
-            print("lines: 1")
-            print("Failed")
-            return
-
-        for p in target_path[1:]:
-            target_object = object.__getattribute__(target_object, p)
         
-        
-        text = "Success"
+        attributes: list[tuple[str, str, bool, str, bool]] = []
         
         for key in object.__dir__(target_object):
-            value = object.__getattribute__(target_object, key)
-            text += f"\n{key} {type(value).__name__} {'T' if type(value) in default_types else 'F'} {repr_data(value)}"
+            attributes.append(self.describe(key, object.__getattribute__(target_object, key)))
         
-        self.message("lines: "+str(text.count("\n")+1))
-        self.message(text.strip())
+        self.reply(attributes)
+
+    def describe_child(self, step: str, name: str, get: Callable[[], object]) -> tuple[str, str, str, bool, str, bool]:
+        try: return (step, *self.describe(name, get()))
+        except Exception as e: return (step, name, type(e).__name__, False, f"<{type(e).__name__}: {e}>", False)
+
+    @suppress_warning
+    def do_children(self, arg: str):
+        """children depth path offset limit: one page of items of a container, or of attributes of anything else.
+        Children are (path step, name, typename, default, value, truncated), the path of a child is path + step."""
+        depth_str, target, offset_str, limit_str = shlex.split(arg)
+        target_object: Any = self.find_object(int(depth_str), target)
+        offset, limit = int(offset_str), int(limit_str)
+        kind = container_kind(target_object)
+        children: list[tuple[str, str, str, bool, str, bool]] = []
+        if kind == "sequence":
+            total = len(target_object)
+            for i in range(offset, min(offset+limit, total)):
+                children.append(self.describe_child(f"[{i}]", f"[{i}]", lambda: target_object[i]))
+        elif kind == "mapping":
+            total = len(target_object)
+            for i, key in enumerate(islice(iter(target_object), offset, offset+limit), offset):
+                step = f"[{key!r}]" if type(key) in LITERAL_KEY_TYPES and len(repr(key)) <= LITERAL_KEY_CHARS else f"[#{i}]"
+                children.append(self.describe_child(step, self.repr.render(key)[0], lambda: target_object[key]))
+        elif kind == "set":
+            total = len(target_object)
+            for i, member in enumerate(islice(iter(target_object), offset, offset+limit), offset):
+                children.append(self.describe_child(f"[#{i}]", f"#{i}", lambda: member))
+        else:
+            names = object.__dir__(target_object)
+            total = len(names)
+            for name in names[offset:offset+limit]:
+                children.append(self.describe_child(f".{name}", name, lambda: object.__getattribute__(target_object, name)))
+        self.reply({"kind": kind, "total": total, "offset": offset, "children": children})
     
+    @suppress_warning
     def do_reqS(self, arg):
-        depth_str, target = arg.split()
-        depth = int(depth_str)
-        target_path = target.split(".")
-        
-        target_object: object = None
-        found_init_object = False
-        
-        for f, v in self.data[depth].items():
-            if f.name == target_path[0]:
-                target_object = v
-                found_init_object = True
-                break
-        if not found_init_object:
-            print("lines: 2")
-            print("Failed.\n Can not find object.")
-            return
-
-        for p in target_path[1:]:
-            target_object = object.__getattribute__(target_object, p)
+        depth_str, target = shlex.split(arg)
+        target_object = self.find_object(int(depth_str), target)
         
+        buffers: list[pickle.PickleBuffer] = []
         try:
-            data = pickle.dumps(target_object)
-            print("lines: 2")
-            print(f"Success.\n{repr(data)}")
+            data = pickle.dumps(target_object, protocol=5, buffer_callback=buffers.append)
+            raws = [buffer.raw() for buffer in buffers]
+        except BufferError: # NOTE a buffer which is not contiguous, pickled in band instead
+            data, raws = pickle.dumps(target_object, protocol=5), []
         except:
-            print("lines: 2")
-            print(f"Failed.\nCan not serialize type '{type(target_object).__name__}'")
+            self.reply(f"Can not serialize type '{type(target_object).__name__}'", KIND_FAILURE)
+            return
+        size = len(data) + sum(raw.nbytes for raw in raws)
+        if size < SHARED_MEMORY_BYTES:
+            self.reply(pickle.dumps(target_object, protocol=5) if raws else data)
+            return
+        # NOTE the pickle and its out-of-band buffers one after another, the visualizer unpickles with views of the segment
+        segment = SharedMemory(create=True, size=size)
+        sizes: list[int] = []
+        offset = 0
+        for chunk in (memoryview(data), *raws):
+            segment.buf[offset:offset+chunk.nbytes] = chunk.cast("B")
+            sizes.append(chunk.nbytes)
+            offset += chunk.nbytes
+        self.segments[segment.name] = segment
+        self.reply({"segment": segment.name, "sizes": sizes})
+
+    def do_release(self, arg: str):
+        for name in arg.split():
+            segment = self.segments.pop(name, None)
+            if segment == None: continue
+            segment.close()
+            segment.unlink()
         
         
         
                 
                 
     @suppress_warning
-    def do_detail(self, arg):
-        depth_str, target = arg.split()
-        depth = int(depth_str)
-        target_path = target.split(".")
-        
-        target_object: object = None
-        found_init_object = False
-        
-        for f, v in self.data[depth].items():
-            if f.name == target_path[0]:
-                target_object = v
-                found_init_object = True
-                break
-        if not found_init_object:
-            print("lines: 1")
-            print("Failed")
+    def do_stats(self, arg):
+        depth_str, target = shlex.split(arg)
+        target_object = self.find_object(int(depth_str), target)
+        if not is_buffer(target_object) and type(target_object) is not bytes:
+            self.reply(f"'{type(target_object).__name__}' is not an array or buffer", KIND_FAILURE)
             return
+        self.reply(buffer_stats(target_object))
 
-        for p in target_path[1:]:
-            target_object = object.__getattribute__(target_object, p)
-        
-        
-        text = "Success"
+    @suppress_warning
+    def do_full(self, arg):
+        depth_str, target = shlex.split(arg)
+        self.reply(repr(self.find_object(int(depth_str), target)))
+
+    def set_history_limit(self, limit: int):
+        """Bytes of rendered steps to keep, 0 stops recording."""
+        restart = limit and not self.history.limit
+        self.history.limit = limit
+        if not limit or restart: self.history.clear()
+        if restart and self.data: # NOTE changes while recording was off are missing, the first step holds every value
+            self.record_history([{loc: (0, value) for loc, value in frame.items()} for frame in self.data])
+        self.history.evict()
+
+    @suppress_warning
+    def do_history(self, arg: str):
+        args = arg.split()
+        if not args:
+            self.reply(self.history.describe())
+        elif args[0] == "limit": # NOTE 0 stops recording
+            self.set_history_limit(int(args[1]))
+            self.reply(self.history.describe())
+        else:
+            try: stack, frames, changes = self.history.state(int(args[0]))
+            except (IndexError, ValueError) as e:
+                self.reply(str(e), KIND_FAILURE)
+                return
+            self.reply({"step": int(args[0]), "stack": stack, "frames": frames, "changes": changes})
+    do_hist = do_history
+
+    @suppress_warning
+    def do_allocations(self, arg: str):
+        args = arg.split()
+        if args and args[0] == "on": self.allocations.start(*map(int, args[1:2]))
+        elif args and args[0] == "off": self.allocations.stop()
+        self.reply(self.allocations.tracing)
+    do_alloc = do_allocations
+
+    def do_profile(self, arg: str):
+        args = arg.split()
+        if args and args[0] == "on": self.profiler.start()
+        elif args and args[0] == "off": self.profiler.stop()
+        elif args and args[0] == "clear": self.profiler.clear()
+        self.reply({"enabled": self.profiler.enabled, "lines": self.profiler.report()})
+    do_prof = do_profile
+
+    @suppress_warning
+    def do_budget(self, arg: str):
+        args = arg.split()
+        if args:
+            chars, depth = map(int, args)
+            self.repr = BoundedRepr(chars, depth)
+        self.reply((self.repr.chars, self.repr.maxlevel))
+
+    @suppress_warning
+    def do_detail(self, arg):
+        depth_str, target = shlex.split(arg)
+        target_object = self.find_object(int(depth_str), target)
         
-        text += f"\n{target_path[-1]} {type(target_object).__name__} {'T' if type(target_object) in default_types else 'F'} {repr_data(target_object)}"
         
-        self.message("lines: "+str(text.count("\n")+1))
-        self.message(text.strip())
+        self.reply(self.describe(self.path_name(target), target_object))
 
 
     def do_compliment(self, arg: str):
@@ -212,72 +559,130 @@ class Debug(pdb.Pdb):
             ld: object = self._getval("locals()")
             assert type(gd) == dict
             assert type(ld) == dict
-            text = "Success.\n" + "\n".join([f"{k} {type(v).__name__}" for k, v in {**gd, **ld}.items() if k.startswith(target)])
-            text = text.strip()
-            self.message("lines: "+str(text.count("\n")+1))
-            self.message(text)
+            self.reply([(k, type(v).__name__) for k, v in {**gd, **ld}.items() if k.startswith(target)])
             return
             
         try:
             val = self._getval(target)
-            text = "Success.\n" + "\n".join([f"{key} {type(object.__getattribute__(val, key)).__name__}" for key in object.__dir__(val) if key.startswith(compare)])
-            text = text.strip()
-            self.message("lines: "+str(text.count("\n")+1))
-            self.message(text)
+            self.reply([(key, type(object.__getattribute__(val, key)).__name__) for key in object.__dir__(val) if key.startswith(compare)])
         except Exception as e:
-            text = "Error Occured.\n"
-            text += str(e)
-            self.message("lines: "+str(text.count("\n")+1))
-            self.message(text.strip())
+            self.reply(str(e), KIND_FAILURE)
             return  # _getval() has displayed the error
     do_comp = do_compliment
+
+    def type_completions(self, cls: type) -> tuple[str, list[tuple[str, str]]]:
+        # NOTE built again only when a class of the mro gains or loses names, the key changes with it
+        mro = cls.__mro__
+        key = f"{getattr(cls, '__module__', '')}.{cls.__qualname__}@{id(cls):x}/" + ".".join(str(len(c.__dict__)) for c in mro)
+        cached = self.completion_types.get(cls)
+        if cached != None and cached[0] == key: return cached
+        names: dict[str, str] = {}
+        for c in reversed(mro):
+            for name, value in c.__dict__.items(): names[name] = type(value).__name__
+        table = (key, sorted(names.items()))
+        try: self.completion_types[cls] = table
+        except TypeError: pass
+        return table
+
+    def do_complete(self, arg: str):
+        """complete [expression [type key]]: every name to complete, or every attribute of the value of expression.
+        The attributes of its type are left out when the client already has them under the same type key."""
+        try:
+            args = shlex.split(arg)
+            if not args:
+                gd: object = self._getval("globals()")
+                ld: object = self._getval("locals()")
+                assert type(gd) == dict
+                assert type(ld) == dict
+                self.reply({"type": None, "names": sorted((k, type(v).__name__) for k, v in {**gd, **ld}.items()), "instance": []})
+                return
+            val = self._getval(args[0])
+        except Exception as e:
+            self.reply(str(e), KIND_FAILURE)
+            return
+        key, names = self.type_completions(type(val))
+        try: attributes = object.__getattribute__(val, "__dict__")
+        except AttributeError: attributes = {}
+        instance = [(k, type(v).__name__) for k, v in attributes.items()] if isinstance(attributes, Mapping) else []
+        self.reply({"type": key, "names": None if args[1:] == [key] else names, "instance": instance})
     def do_evp(self, arg):
         try:
             val = self._getval(arg)
         except Exception as e:
-            text = ""
-            text += str(e)
-            self.message("lines: "+str(text.count("\n")+1))
-            self.message(text.strip())
+            self.reply(str(e), KIND_FAILURE)
             return  # _getval() has displayed the error
         try:
-            text = pprint.pformat(repr_data(val))
-            self.message("lines: "+str(text.count("\n")+1))
-            self.message(text.strip())
-        except:
+            self.reply(pprint.pformat(repr_data(val)))
+        except Exception as e:
             self._error_exc() # type: ignore
+            self.reply(str(e), KIND_FAILURE)
         
     def do_frames(self, arg: str, slient: bool = False):
+        delta = self.update_frames()
+        if not slient:
+            self.reply(self.render_delta(delta))
         
+        self.lastframe = self.curframe
+
+    def update_frames(self) -> list[dict[VariableInfo, tuple[int, Any]]]:
         frame = self.curframe
-        if frame == None: return
+        if frame == None: return []
         frame_depth_counter = frame
         frame_list = [frame]
         while True:
             frame_depth_counter = cast(FrameType, frame_depth_counter).f_back
             if frame_depth_counter == None: break
-            frame_list.insert(0, frame_depth_counter)
+            frame_list.append(frame_depth_counter)
+        frame_list.reverse()
         frame_depth = len(frame_list) - 1
         
         while frame_depth+1 > len(self.data):
             self.data.append({})
+            self.states.append({})
         
             
         newData: list[dict[VariableInfo, Any]] = [{} for _ in range(frame_depth+1)]
+        newStates: list[dict[VariableInfo, tuple[int | bytes | None, int]]] = [{} for _ in range(frame_depth+1)]
         delta: list[dict[VariableInfo, tuple[int, Any]]] = [{} for _ in range(max(frame_depth+1, len(self.data)))]
         
+        frame_marks: list[tuple[FrameType, int]] = []
+        scanned: list[int] = []
         for depth in range(frame_depth+1):
-            frame_info = inspect.getframeinfo(cast(FrameType, frame_list[depth]))
-            for key, value in cast(FrameType, frame_list[depth]).f_locals.items():
-                loc = VariableInfo(frame_info.filename, frame_info.lineno, frame_info.function, key)
+            target_frame = cast(FrameType, frame_list[depth])
+            frame_marks.append((target_frame, target_frame.f_lasti))
+            # NOTE Fast locals of a function frame only change while it runs. Cells may be written by other functions,
+            #      and module and class bodies share their namespace with other code, so those frames are always scanned.
+            code = target_frame.f_code
+            if depth < len(self.frame_marks) and frame_marks[depth] == self.frame_marks[depth] and code.co_flags & inspect.CO_OPTIMIZED and not (code.co_cellvars or code.co_freevars):
+                # NOTE the bindings are the same, but a callee may have mutated the objects they refer to
+                newData[depth] = self.data[depth]
+                newStates[depth] = states = dict(self.states[depth])
+                for loc, value in newData[depth].items():
+                    value_fingerprint = fingerprint(value)
+                    last_fingerprint, token = states[loc]
+                    if value_fingerprint == None or value_fingerprint != last_fingerprint:
+                        delta[depth][loc] = (1 if value_fingerprint != None else 3, value)
+                        states[loc] = (value_fingerprint, next(self.tokens))
+                continue
+            scanned.append(depth)
+            for key, value in target_frame.f_locals.items():
+                loc = VariableInfo(code.co_filename, target_frame.f_lineno, code.co_name, key)
+                value_fingerprint = fingerprint(value)
                 if loc in self.data[depth]:
-                    if value is not self.data[depth][loc]:
+                    last_fingerprint, token = self.states[depth][loc]
+                    if value is not self.data[depth][loc] or value_fingerprint != last_fingerprint:
                         delta[depth][loc] = (1, value)
+                        token = next(self.tokens)
+                    elif value_fingerprint == None:
+                        delta[depth][loc] = (3, value)
+                        token = next(self.tokens)
                 else:
                     delta[depth][loc] = (0, value)
+                    token = next(self.tokens)
                 newData[depth][loc] = value
+                newStates[depth][loc] = (value_fingerprint, token)
         
-        for depth in range(frame_depth+1):
+        for depth in scanned:
             for check_deleted in self.data[depth]:
                 if check_deleted not in newData[depth]:
                     if check_deleted not in delta[depth].keys():
@@ -287,20 +692,108 @@ class Debug(pdb.Pdb):
             for deleted in self.data[depth]:
                 delta[depth][deleted] = (2, self.data[depth][deleted])
         self.data = newData
-        
-        if not slient:
-            text = ""
-            for frame_index, delta_dict in enumerate(delta):
-                for loc, (mode, value) in delta_dict.items():
-                    text += f'[{frame_index}] File "{loc.filename}", line {loc.lineno}, in {loc.function}\n'
+        self.states = newStates
+        self.frame_marks = frame_marks
+        if self.history.limit:
+            self.record_history(delta)
+        return delta
 
+    def record_history(self, delta: list[dict[VariableInfo, tuple[int, Any]]]):
+        changes: list[tuple[int, str, str, str, str, bool]] = []
+        # NOTE removals first, a new frame at the same depth may reuse names of the removed one
+        for depth, delta_dict in enumerate(delta):
+            for loc, (mode, value) in delta_dict.items():
+                if mode == 2: changes.append((depth, "-", loc.name, "", "", False))
+        for depth, delta_dict in enumerate(delta):
+            for loc, (mode, value) in delta_dict.items():
+                if mode != 2: changes.append((depth, "+*-?"[mode], loc.name, type(value).__name__, *self.repr.render(value)))
+        self.history.record(self.stack_positions(), changes)
 
-                    text += "+*-"[mode] + " " + loc.name + " " + str(type(value).__name__) + " " + repr_data(value) +"\n"
-        
-            self.message("lines: "+str(text.count("\n")))
-            self.message(text.strip())
-        
+    # NOTE Values are not rendered here, the visualizer fetches them with values for the rows on screen.
+    def render_delta(self, delta: list[dict[VariableInfo, tuple[int, Any]]]) -> list[tuple[int, str, int, str, str, str, str, int]]:
+        variables: list[tuple[int, str, int, str, str, str, str, int]] = []
+        for frame_index, delta_dict in enumerate(delta):
+            for loc, (mode, value) in delta_dict.items():
+                token = self.states[frame_index][loc][1] if mode != 2 else 0
+                variables.append((frame_index, loc.filename, loc.lineno, loc.function, "+*-?"[mode], loc.name, type(value).__name__, token))
+        return variables
+
+    @suppress_warning
+    def do_values(self, arg: str):
+        args = arg.split()
+        requested: dict[int, set[str]] = {}
+        for depth, name in zip(args[0::2], args[1::2]):
+            requested.setdefault(int(depth), set()).add(name)
+        values: list[tuple[int, str, str, int, str, bool]] = []
+        for depth, names in requested.items():
+            if depth >= len(self.data): continue
+            for loc, value in self.data[depth].items():
+                if loc.name in names:
+                    values.append((depth, loc.name, type(value).__name__, self.states[depth][loc][1], *self.repr.render(value)))
+        self.reply(values)
+
+    def snapshot(self, subscriptions: list[tuple[int, str]]) -> dict[str, Any]:
+        allocations = self.allocations.growth() if self.allocations.tracing else None # NOTE before the scan allocates
+        attributes: list[tuple[str, str, bool, str, bool] | None] = []
+        variables = self.render_delta(self.update_frames())
         self.lastframe = self.curframe
+        for depth, target in subscriptions:
+            try: attributes.append(self.describe(self.path_name(target), self.find_object(depth, target)))
+            except Exception: attributes.append(None)
+        return {
+            "stack": self.stack_positions(),
+            "variables": variables,
+            "attributes": attributes,
+            "allocations": allocations
+        }
+
+    def subscribe_snapshot(self, arg: str): # NOTE reply is sent by preloop when the next stop is reached
+        args = shlex.split(arg)
+        self.resume_request = (self.request_id, [(int(depth), target) for depth, target in zip(args[0::2], args[1::2])])
+        self.replied = True
+
+    @suppress_warning # NOTE bad subscriptions fail before the program resumes
+    def do_snapshot(self, arg: str):
+        self.subscribe_snapshot(arg)
+        return self.do_step("")
+    do_snap = do_snapshot
+
+    @suppress_warning
+    def do_continue_snapshot(self, arg: str):
+        self.subscribe_snapshot(arg)
+        return self.do_continue("")
+    do_csnap = do_continue_snapshot
+
+    @suppress_warning
+    def do_bp(self, arg: str):
+        filename, lineno_str, *condition = shlex.split(arg)
+        lineno = int(lineno_str)
+        # NOTE bdb evaluates cond with eval() on every hit, a code object skips parsing the source again.
+        code = compile(condition[0], f"<breakpoint {Path(filename).name}:{lineno}>", "eval") if condition else None
+        if self.get_breaks(filename, lineno):
+            self.clear_break(filename, lineno)
+        error = self.set_break(filename, lineno, cond=code) # type: ignore
+        if error:
+            self.reply(error, KIND_FAILURE)
+            return
+        self.reply((self.canonic(filename), lineno))
+
+    @suppress_warning
+    def do_nobp(self, arg: str):
+        filename, lineno_str = shlex.split(arg)
+        error = self.clear_break(filename, int(lineno_str))
+        if error:
+            self.reply(error, KIND_FAILURE)
+            return
+        self.reply((self.canonic(filename), int(lineno_str)))
+
+    def preloop(self):
+        self.profiler.pause()
+        super().preloop()
+        if self.resume_request != None:
+            self.command_started = time.perf_counter() # NOTE the time the program ran is not work of the debugger
+            (request_id, subscriptions), self.resume_request = self.resume_request, None
+            self.reply(None if subscriptions == None else self.snapshot(subscriptions), request_id=request_id)
 
     def do_args_memory_usage(self, arg: str):
         assert self.curframe != None
@@ -321,24 +814,46 @@ class Debug(pdb.Pdb):
 
     do_amu = do_args_memory_usage
 
+    @suppress_warning
+    def do_memory(self, arg: str):
+        # NOTE outermost frames first, module globals rarely change and keep the unfinished pass going between steps
+        rows = [(depth, loc, value) for depth, frame in enumerate(self.data) for loc, value in frame.items()]
+        budget = int(arg) / 1000 if arg.strip() else MEMORY_BUDGET
+        sizes = self.memory.measure([((id(value), self.states[depth][loc][1]), value) for depth, loc, value in rows], budget)
+        self.reply({
+            "rows": [(depth, loc.name, type(value).__name__, size, exact) for (depth, loc, value), (size, exact) in zip(rows, sizes)],
+            "total": self.memory.total(),
+            "pending": self.memory.pending(),
+            "elapsed": self.memory.elapsed,
+        })
+    do_mem = do_memory
 
-def execute(target: str, arg: str, show_console: bool) -> None:
-    
-    raise NotImplementedError("execute is not implemented. This may occured when visual.debug() is runned ignoring SystemError exception.")
 
+execute: Callable[[str, list[str], bool], None]
 if platform.system() == "Windows":
     from ctypes import wintypes as w
     shell32 = ctypes.windll.shell32
     shell32.ShellExecuteA.argtypes = w.HWND, w.LPCSTR, w.LPCSTR, w.LPCSTR, w.LPCSTR, w.INT
     shell32.ShellExecuteA.restype = w.HINSTANCE
-    def execute_windows(target: str, arg: str, show_console: bool):
-        shell32.ShellExecuteA(None, b"open", target.encode(), arg.encode(), None, show_console)
+    def execute_windows(target: str, args: list[str], show_console: bool):
+        shell32.ShellExecuteA(None, b"open", target.encode(), subprocess.list2cmdline(args).encode(), None, show_console)
     execute = execute_windows
 else:
-    raise SystemError(f"Failed to initialize shell execution in {platform.system()}")
+    def execute_posix(target: str, args: list[str], show_console: bool):
+        # NOTE there is no console window to open, the visualizer writes to this terminal only if show_console
+        output = None if show_console else subprocess.DEVNULL
+        subprocess.Popen([target, *args], stdout=output, stderr=output, start_new_session=True)
+    execute = execute_posix
 
 debugger = Debug()
-def debug(debugger_path: str, show_console = False):
+def debug(debugger_path: str, show_console = False, record: str | None = None, allocations: bool = False, profile: bool = False, history: bool = False):
+    if record != None and "Visual.py-subprocess" not in sys.argv:
+        # NOTE Recording mode. The program runs without the visualizer, open the trace with traceview.py afterwards.
+        trace_recorder = recorder.Recorder(record, BoundedRepr().render, exclude=(__file__, recorder.__file__, tracking.__file__))
+        atexit.register(trace_recorder.stop)
+        print("Recording to", record)
+        trace_recorder.start(sys._getframe().f_back)
+        return
     if "Visual.py-subprocess" not in sys.argv:
         print("Running visualpy.")
         print("Ensure argument Visual.py-subprocess is not contained originally.")
@@ -346,13 +861,16 @@ def debug(debugger_path: str, show_console = False):
         print("Python:", python_path)
         print("Debugger:", debugger_path)
         print("Arguments:", sys.argv)
-        execute(python_path, debugger_path + " " + " ".join(sys.argv), show_console)
+        execute(python_path, [debugger_path, *sys.argv], show_console)
         exit()
     else:
         frame = sys._getframe().f_back
         if __name__ != "__main__": frame = cast(FrameType, frame).f_back
         debugger.curframe = frame
+        if history: debugger.set_history_limit(HISTORY_BYTES)
         debugger.do_frames("", slient=True)
+        if allocations: debugger.allocations.start()
+        if profile: debugger.profiler.start()
         debugger.set_trace(frame)
 
 if __name__ == "__main__":